@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    __main__.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+''' Bench runner: runs the sequences of a profile file on an LG1800.
+
+    python -m serialLG1800 --port socket://192.168.0.8:3800 --profile oven.json run full
+    python -m serialLG1800 --port /dev/ttyUSB0 --profile oven.json throughput full --cycles 200
+    python -m serialLG1800 --port fake --profile oven.json soak full --hours 8
+
+The profile file (JSON, or YAML with PyYAML installed) holds the configuration
+applied once at start (see profiles.ProfileStore) and the named sequences
+(see sequences.Sequence):
+    {"name": "oven",
+     "configuration": {"PW:TIME": 1.0, "H5:IMAX": 0.003},
+     "sequences": {"full": {"policy": "fail-fast", "steps": [{"test": "CT"}, {"test": "PW", "limits": {"rmax": 0.1}}]}}}
+--port fake uses the loopback instrument of fakeLG.
+'''
+
+import argparse
+import json
+import logging
+import sys
+import time
+from . import fakeLG
+from . import profiles
+from . import sequences
+from .serialLG1800 import LG1800
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100.0
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+def latencyReport(durations):
+    ordered = sorted(durations)
+    report = dict(('p%d' % p, percentile(ordered, p)) for p in (50, 90, 99))
+    report['min'] = ordered[0] if ordered else None
+    report['max'] = ordered[-1] if ordered else None
+    return report
+
+def linkReport(lg):
+    return {'counters': dict(lg.counters),
+    'reconnects': max(0, lg.counters['connections'] - 1),
+    # errorQueue holds only the last entries, errorCodes counts all of them
+    'errorCodes': dict(sorted(lg.errorCodes.items())),
+    'errorQueue': [{'time': t, 'code': code, 'message': msg} for t, code, msg in lg.errorLog],
+    'pacing': lg.pacer.stats()
+    }
+
+def connect(options):
+    if options.port == 'fake':
+        port = fakeLG.FakeLG1800(latency=options.fake_latency, testTime=options.fake_test_time)
+    else:
+        port = options.port
+    return LG1800(port, adaptivePacing=not options.fixed_pacing, audio=options.audio)
+
+def loadSequence(lg, options):
+    store = profiles.ProfileStore(lg)
+    recipe = store.loadRecipe(options.profile)
+    available = recipe.get('sequences', {})
+    if options.sequence not in available:
+        raise SystemExit("sequence %s not found in %s (available: %s)" % (options.sequence, options.profile,
+            ", ".join(sorted(available)) or "none"))
+    if recipe.get('configuration'):
+        store.apply(store.compile(recipe))
+    definition = dict(available[options.sequence])
+    definition.setdefault('name', options.sequence)
+    return sequences.Sequence.fromDict(definition)
+
+def cycle(lg, sequence, deadline=None):
+    # deadline (time.monotonic()) bounds the reconnection attempts
+    if not lg.connected:
+        lg.testConnection(deadline)
+        if not lg.connected:
+            return (None, 0.0)
+    t0 = time.monotonic()
+    result = sequence(lg)
+    return (result, time.monotonic() - t0)
+
+def serializable(result):
+    # results.Result records are mappings, json needs dicts
+    steps = [(test, r.toDict()) for test, r in result['steps']]
+    return dict(result, steps=steps)
+
+def commandRun(lg, sequence, options):
+    for i in range(options.cycles):
+        result, duration = cycle(lg, sequence)
+        print(json.dumps(serializable(result), default=str))
+    return 0
+
+def commandThroughput(lg, sequence, options):
+    durations = []
+    passed = 0
+    t0 = time.monotonic()
+    for i in range(options.cycles):
+        result, duration = cycle(lg, sequence)
+        durations.append(duration)
+        if result['result']:
+            passed += 1
+    elapsed = time.monotonic() - t0
+    report = {'cycles': options.cycles,
+    'passed': passed,
+    'elapsed': elapsed,
+    'dutsPerHour': options.cycles * 3600.0 / elapsed if elapsed > 0 else None,
+    'latency': latencyReport(durations),
+    'link': linkReport(lg)
+    }
+    print(json.dumps(report, indent=1, default=str))
+    return 0
+
+def commandSoak(lg, sequence, options):
+    durations = []
+    failed = 0
+    # cycles ended by an exception (e.g. a garbled reply) and by a lost connection
+    exceptions = {}
+    disconnected = 0
+    start = time.monotonic()
+    end = start + options.hours * 3600
+    nextReport = start + options.report_every
+    try:
+        while time.monotonic() < end:
+            try:
+                result, duration = cycle(lg, sequence, end)
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                name = type(e).__name__
+                exceptions[name] = exceptions.get(name, 0) + 1
+                logging.warning("soak: cycle aborted by %s: %s", name, e)
+                continue
+            if result is None:
+                disconnected += 1
+                time.sleep(min(5, max(0, end - time.monotonic())))
+                continue
+            durations.append(duration)
+            if not result['result']:
+                failed += 1
+            if time.monotonic() >= nextReport:
+                nextReport += options.report_every
+                logging.warning("soak: %d cycles, %d failed, %d aborted, %s, errors by code %s", len(durations), failed,
+                    sum(exceptions.values()), lg.counters, dict(lg.errorCodes))
+    except KeyboardInterrupt:
+        logging.warning("soak interrupted")
+    elapsed = time.monotonic() - start
+    report = {'cycles': len(durations),
+    'failed': failed,
+    'aborted': exceptions,
+    'disconnected': disconnected,
+    'elapsed': elapsed,
+    'dutsPerHour': len(durations) * 3600.0 / elapsed if elapsed > 0 else None,
+    'latency': latencyReport(durations),
+    'link': linkReport(lg)
+    }
+    print(json.dumps(report, indent=1, default=str))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m serialLG1800", description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', required=True, help="COMx, /dev/ttyX, tcp://host:port (raw socket), a pySerial URL (socket://host:port) or 'fake'")
+    parser.add_argument('--profile', required=True, help="profile file with configuration and sequences")
+    parser.add_argument('--audio', action='store_true', help="open the audio input for the vibration test")
+    parser.add_argument('--fixed-pacing', action='store_true', help="don't calibrate the gap between commands")
+    parser.add_argument('--fake-latency', type=float, default=0.002, help="reply latency of --port fake")
+    parser.add_argument('--fake-test-time', type=float, default=0.5, help="duration of the tests of --port fake")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help="run a sequence")
+    p.add_argument('sequence')
+    p.add_argument('--cycles', type=int, default=1)
+    p = sub.add_parser('throughput', help="run N cycles and report DUTs/hour and latency percentiles")
+    p.add_argument('sequence')
+    p.add_argument('--cycles', type=int, default=100)
+    p = sub.add_parser('soak', help="run for hours, recording reconnects, resyncs and device errors")
+    p.add_argument('sequence')
+    p.add_argument('--hours', type=float, default=8.0)
+    p.add_argument('--report-every', type=float, default=600.0, help="seconds between progress lines")
+    options = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING)
+    if options.command is None:
+        parser.print_help()
+        return 2
+    lg = connect(options)
+    sequence = loadSequence(lg, options)
+    commands = {'run': commandRun, 'throughput': commandThroughput, 'soak': commandSoak}
+    return commands[options.command](lg, sequence, options)
+
+if __name__ == '__main__':
+    sys.exit(main())
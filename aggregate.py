@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    aggregate.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+''' Mergeable statistics of the test results, per product and test type.
+Every station keeps a StationAggregator fed by its LG1800 (see attach()),
+publishes toBytes() snapshots and a supervisor combines them:
+
+    line = aggregate.mergeAll(snapshots)
+    line.summary()
+
+Merging is associative and commutative, merging the snapshots of two stations
+gives the same statistics as a single station testing all the DUTs
+(the moments up to floating point rounding).
+'''
+
+import math
+import struct
+from . import results
+from .spc import RunningStats
+
+MAGIC = b'LGAG'
+VERSION = 1
+# magic, version, sketch accuracy, number of stations, number of aggregates
+HEADER = struct.Struct('<4sBdHI')
+COUNTS = struct.Struct('<QQ')
+MOMENTS = struct.Struct('<Qdddd')
+EDGES = struct.Struct('<ddH')
+BUCKET = struct.Struct('<iQ')
+COUNT = struct.Struct('<Q')
+LENGTH = struct.Struct('<H')
+NUMBER = struct.Struct('<I')
+
+
+class FixedHistogram(object):
+    """ Histogram with fixed bins between low and high, plus one bin below
+    and one above the range. Two histograms merge only if they have the same bins.
+    """
+    __slots__ = ('low', 'high', 'bins', 'width', 'counts')
+
+    def __init__(self, low, high, bins=20):
+        self.low = float(low)
+        self.high = float(high)
+        self.bins = bins
+        self.width = (self.high - self.low) / bins
+        self.counts = [0] * (bins + 2)
+
+    def update(self, x):
+        if x < self.low:
+            self.counts[0] += 1
+        elif x >= self.high:
+            self.counts[-1] += 1
+        else:
+            self.counts[int((x - self.low) / self.width) + 1] += 1
+
+    def merge(self, other):
+        if (self.low, self.high, self.bins) != (other.low, other.high, other.bins):
+            raise ValueError("histograms with different bins")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        return self
+
+    def edges(self):
+        return [self.low + i * self.width for i in range(self.bins + 1)]
+
+
+class QuantileSketch(object):
+    """ Quantiles with relative error 'accuracy' (DDSketch): the values fall in
+    logarithmic buckets, gamma^(i-1) < |x| <= gamma^i, only the counts are kept.
+    Merging adds the counts, so it is exact and independent of the order.
+    """
+    __slots__ = ('accuracy', 'gamma', 'logGamma', 'positive', 'negative', 'zero')
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.logGamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+
+    def key(self, x):
+        return int(math.ceil(math.log(x) / self.logGamma))
+
+    def update(self, x):
+        if x > 0:
+            k = self.key(x)
+            self.positive[k] = self.positive.get(k, 0) + 1
+        elif x < 0:
+            k = self.key(-x)
+            self.negative[k] = self.negative.get(k, 0) + 1
+        else:
+            self.zero += 1
+
+    def merge(self, other):
+        if self.accuracy != other.accuracy:
+            raise ValueError("sketches with different accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for k, c in theirs.items():
+                mine[k] = mine.get(k, 0) + c
+        self.zero += other.zero
+        return self
+
+    def count(self):
+        return sum(self.positive.values()) + sum(self.negative.values()) + self.zero
+
+    def value(self, k):
+        # centre of the bucket, within 'accuracy' of every value in it
+        return 2 * self.gamma ** k / (self.gamma + 1)
+
+    def quantile(self, q):
+        n = self.count()
+        if n == 0:
+            return None
+        rank = q * (n - 1)
+        seen = 0
+        for k in sorted(self.negative, reverse=True):
+            seen += self.negative[k]
+            if seen > rank:
+                return -self.value(k)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.positive):
+            seen += self.positive[k]
+            if seen > rank:
+                return self.value(k)
+        return self.value(max(self.positive))
+
+
+class FieldAggregate(object):
+    """ Moments, optional histogram and quantile sketch of one measured field. """
+
+    def __init__(self, histogram=None, accuracy=0.01):
+        self.stats = RunningStats()
+        self.histogram = histogram
+        self.sketch = QuantileSketch(accuracy)
+
+    def update(self, x):
+        self.stats.update(x)
+        self.sketch.update(x)
+        if self.histogram is not None:
+            self.histogram.update(x)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        if other.histogram is not None:
+            if self.histogram is None:
+                self.histogram = FixedHistogram(other.histogram.low, other.histogram.high, other.histogram.bins)
+            self.histogram.merge(other.histogram)
+        return self
+
+    def summary(self):
+        s = self.stats
+        summary = {'n': s.n, 'mean': s.mean, 'stddev': s.stddev(),
+        'min': s.min if s.n else None, 'max': s.max if s.n else None,
+        'p50': self.sketch.quantile(0.5), 'p90': self.sketch.quantile(0.9), 'p99': self.sketch.quantile(0.99)
+        }
+        if self.histogram is not None:
+            summary['histogram'] = {'edges': self.histogram.edges(), 'counts': list(self.histogram.counts)}
+        return summary
+
+
+class TestAggregate(object):
+    """ Results of one test type for one product: counts, failures by reason
+    and a FieldAggregate per numeric field of the result record.
+    """
+
+    def __init__(self, product, test):
+        self.product = product
+        self.test = test
+        self.count = 0
+        self.passed = 0
+        self.reasons = {}
+        self.fields = {}
+
+    def field(self, name, histograms=None, accuracy=0.01):
+        f = self.fields.get(name)
+        if f is None:
+            h = (histograms or {}).get((self.test, name))
+            f = self.fields[name] = FieldAggregate(FixedHistogram(*h) if h is not None else None, accuracy)
+        return f
+
+    def update(self, record, histograms=None, accuracy=0.01):
+        self.count += 1
+        if record['result']:
+            self.passed += 1
+        else:
+            reason = record.get('reason') or ""
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        for name in results.RECORDS[self.test].numeric:
+            x = record.get(name)
+            # fields not measured (e.g. currentFwd in autotest) are skipped
+            if x is None:
+                continue
+            try:
+                x = float(x)
+            except (TypeError, ValueError):
+                continue
+            if x == x:
+                self.field(name, histograms, accuracy).update(x)
+
+    def merge(self, other):
+        self.count += other.count
+        self.passed += other.passed
+        for reason, c in other.reasons.items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + c
+        for name, f in other.fields.items():
+            mine = self.fields.get(name)
+            if mine is None:
+                mine = self.fields[name] = FieldAggregate(None, f.sketch.accuracy)
+            mine.merge(f)
+        return self
+
+    def summary(self):
+        return {'count': self.count, 'passed': self.passed, 'failed': self.count - self.passed,
+        'passRate': self.passed / float(self.count) if self.count else None,
+        'reasons': dict(self.reasons),
+        'fields': dict((name, f.summary()) for name, f in self.fields.items())
+        }
+
+
+class StationAggregator(object):
+    """ TestAggregate per (product, test) of the results of one station,
+    or of many after merge().
+    histograms: optional {(test, field): (low, high, bins)}, every station of
+    a line must use the same bins to be merged.
+    """
+
+    def __init__(self, product=None, histograms=None, accuracy=0.01):
+        self.product = product
+        self.histograms = histograms or {}
+        self.accuracy = accuracy
+        self.aggregates = {}
+        # results per station (serial number of the LG1800)
+        self.stations = {}
+        self.station = None
+
+    def attach(self, lg, product=None):
+        if product is not None:
+            self.product = product
+        self.station = getattr(lg, 'lgsn', None)
+        lg.resultListeners.append(self.update)
+
+    def aggregate(self, product, test):
+        a = self.aggregates.get((product, test))
+        if a is None:
+            a = self.aggregates[(product, test)] = TestAggregate(product, test)
+        return a
+
+    def update(self, record, testLimits=None, product=None, test=None):
+        # record: a results.Result or the equivalent dict, with test given
+        test = test or record.test
+        if product is None:
+            product = self.product
+        self.aggregate(product, test).update(record, self.histograms, self.accuracy)
+        station = self.station or ""
+        self.stations[station] = self.stations.get(station, 0) + 1
+
+    def merge(self, other):
+        if other.accuracy != self.accuracy:
+            raise ValueError("aggregators with different sketch accuracy")
+        for key, a in other.aggregates.items():
+            self.aggregate(*key).merge(a)
+        for station, c in other.stations.items():
+            self.stations[station] = self.stations.get(station, 0) + c
+        return self
+
+    def summary(self):
+        return {'stations': dict(self.stations),
+        'tests': dict(("%s/%s" % key if key[0] is not None else key[1], a.summary()) for key, a in self.aggregates.items())
+        }
+
+    # ########################## #
+    #       binary snapshot      #
+    # ########################## #
+
+    def toBytes(self):
+        out = bytearray(HEADER.pack(MAGIC, VERSION, self.accuracy, len(self.stations), len(self.aggregates)))
+        for station, c in self.stations.items():
+            putString(out, station)
+            out += COUNT.pack(c)
+        for (product, test), a in self.aggregates.items():
+            putString(out, product)
+            putString(out, test)
+            out += COUNTS.pack(a.count, a.passed)
+            out += NUMBER.pack(len(a.reasons))
+            for reason, c in a.reasons.items():
+                putString(out, reason)
+                out += COUNT.pack(c)
+            out += NUMBER.pack(len(a.fields))
+            for name, f in a.fields.items():
+                putString(out, name)
+                s = f.stats
+                out += MOMENTS.pack(s.n, s.mean, s.m2, s.min, s.max)
+                h = f.histogram
+                if h is None:
+                    out += EDGES.pack(0.0, 0.0, 0)
+                else:
+                    out += EDGES.pack(h.low, h.high, h.bins)
+                    out += struct.pack('<%dQ' % len(h.counts), *h.counts)
+                sk = f.sketch
+                out += COUNT.pack(sk.zero)
+                for buckets in (sk.positive, sk.negative):
+                    out += NUMBER.pack(len(buckets))
+                    for k, c in buckets.items():
+                        out += BUCKET.pack(k, c)
+        return bytes(out)
+
+    @classmethod
+    def fromBytes(cls, data):
+        data = memoryview(data)
+        magic, version, accuracy, nstations, naggregates = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a LG1800 aggregate")
+        if version != VERSION:
+            raise ValueError("unsupported aggregate version %d" % version)
+        aggregator = cls(accuracy=accuracy)
+        offset = HEADER.size
+        for i in range(nstations):
+            station, offset = getString(data, offset)
+            aggregator.stations[station] = COUNT.unpack_from(data, offset)[0]
+            offset += COUNT.size
+        for i in range(naggregates):
+            product, offset = getString(data, offset)
+            test, offset = getString(data, offset)
+            a = aggregator.aggregates[(product, test)] = TestAggregate(product, test)
+            a.count, a.passed = COUNTS.unpack_from(data, offset)
+            offset += COUNTS.size
+            n = NUMBER.unpack_from(data, offset)[0]
+            offset += NUMBER.size
+            for j in range(n):
+                reason, offset = getString(data, offset)
+                a.reasons[reason] = COUNT.unpack_from(data, offset)[0]
+                offset += COUNT.size
+            n = NUMBER.unpack_from(data, offset)[0]
+            offset += NUMBER.size
+            for j in range(n):
+                name, offset = getString(data, offset)
+                f = a.fields[name] = FieldAggregate(None, accuracy)
+                s = f.stats
+                s.n, s.mean, s.m2, s.min, s.max = MOMENTS.unpack_from(data, offset)
+                offset += MOMENTS.size
+                low, high, bins = EDGES.unpack_from(data, offset)
+                offset += EDGES.size
+                if bins:
+                    f.histogram = FixedHistogram(low, high, bins)
+                    f.histogram.counts = list(struct.unpack_from('<%dQ' % (bins + 2), data, offset))
+                    offset += COUNT.size * (bins + 2)
+                sk = f.sketch
+                sk.zero = COUNT.unpack_from(data, offset)[0]
+                offset += COUNT.size
+                for buckets in (sk.positive, sk.negative):
+                    nb = NUMBER.unpack_from(data, offset)[0]
+                    offset += NUMBER.size
+                    for k, c in BUCKET.iter_unpack(data[offset:offset + nb * BUCKET.size]):
+                        buckets[k] = c
+                    offset += nb * BUCKET.size
+        return(aggregator)
+
+
+def putString(out, text):
+    # None (no product) is written as a single 0xff byte, never valid UTF-8
+    raw = b'\xff' if text is None else text.encode('UTF-8')
+    out += LENGTH.pack(len(raw))
+    out += raw
+
+def getString(data, offset):
+    n = LENGTH.unpack_from(data, offset)[0]
+    offset += LENGTH.size
+    raw = bytes(data[offset:offset + n])
+    return (None if raw == b'\xff' else raw.decode('UTF-8'), offset + n)
+
+def mergeAll(snapshots):
+    ''' Combines StationAggregator objects or their toBytes() snapshots into a new aggregator. '''
+    total = None
+    for s in snapshots:
+        if not isinstance(s, StationAggregator):
+            s = StationAggregator.fromBytes(s)
+        if total is None:
+            total = StationAggregator(accuracy=s.accuracy)
+        total.merge(s)
+    return total if total is not None else StationAggregator()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    bench.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+''' Benchmarks of the host side hot paths and of whole test cycles against
+the loopback instrument of fakeLG.
+
+    python -m serialLG1800.bench run -o before.json
+    python -m serialLG1800.bench run -o after.json --latency 0.002
+    python -m serialLG1800.bench compare before.json after.json --threshold 0.1
+'''
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import numpy as np
+from . import fakeLG
+from . import sequences
+from . import vibes
+from .serialLG1800 import LG1800
+
+CASES = []
+
+def case(name, endToEnd=False):
+    # registers a function returning the callable to be timed
+    def register(setup):
+        CASES.append((name, endToEnd, setup))
+        return setup
+    return register
+
+def newLG(latency=0.0, testTime=0.0):
+    fake = fakeLG.FakeLG1800(latency=latency, testTime=testTime)
+    lg = LG1800(fake, adaptivePacing=latency > 0, audio=False)
+    if latency == 0:
+        # nothing to wait for on the loopback
+        for c in lg.pacer.CLASSES:
+            lg.pacer.gap[c] = 0.0
+    return lg
+
+# ########################## #
+#      Host side paths       #
+# ########################## #
+
+@case("valid")
+def benchValid(options):
+    lg = newLG()
+    return lambda: lg.valid("READ:H5:CURRMAX?", "REPLY")
+
+@case("formatConfiguration")
+def benchFormat(options):
+    lg = newLG()
+    pars = (("PW:TIME", 1.0), ("I5:UNOM", 1000), ("H5:IMAX", 0.003), ("I5:SKINP", 3), ("H5:RERR", "normal"))
+    def run():
+        for par, value in pars:
+            lg.formatConfiguration(par, value)
+    return run
+
+@case("fixedFloatSerial")
+def benchFixed(options):
+    lg = newLG()
+    return lambda: lg.fixedFloatSerial(12.34)
+
+@case("fpFloatSerial")
+def benchFp(options):
+    lg = newLG()
+    return lambda: lg.fpFloatSerial(0.0031)
+
+@case("integer2digit")
+def benchInteger(options):
+    lg = newLG()
+    return lambda: lg.integer2digit(7)
+
+@case("decodeERR")
+def benchERR(options):
+    lg = newLG()
+    return lambda: lg.decodeERR(b'3,Wrong command\r\n')
+
+@case("decodeIDN")
+def benchIDN(options):
+    lg = newLG()
+    return lambda: lg.decodeIDN(b'SPS electronic LG1800B,Ver. 1.00,S/N:FAKE0001\r\n')
+
+@case("updateState")
+def benchUpdateState(options):
+    # zero latency loopback: mostly the decoding of *STA?
+    lg = newLG()
+    return lg.updateState
+
+@case("inputLevels")
+def benchInputLevels(options):
+    lg = newLG()
+    lg.port.inputs = 0x4142
+    return lg.inputLevels
+
+@case("campiona")
+def benchCampiona(options):
+    va = vibes.VibesAnalyzer(openStream=False)
+    t = np.arange(int(va.RATE * va.RECORD_SECONDS)) / float(va.RATE)
+    rng = np.random.RandomState(0)
+    data = (0.2 * np.sin(2 * np.pi * 2300 * t) + 0.05 * rng.randn(len(t))).astype(np.float32)
+    return lambda: va.campiona(data)
+
+# ########################## #
+#     End to end cycles      #
+# ########################## #
+
+def runner(method, **kwargs):
+    def setup(options):
+        lg = newLG(options.latency, options.testTime)
+        return lambda: getattr(lg, method)(**kwargs)
+    return setup
+
+case("runCT", True)(runner("runCT"))
+case("runPW", True)(runner("runPW", rmax=0.1))
+case("runIS", True)(runner("runIS", rmin=1e6))
+case("runHV", True)(runner("runHV"))
+case("runFT", True)(runner("runFT", pausa=0.0))
+case("runLC", True)(runner("runLC"))
+
+@case("sequence", True)
+def benchSequence(options):
+    lg = newLG(options.latency, options.testTime)
+    seq = sequences.Sequence([{'test': 'CT'},
+        {'test': 'PW', 'limits': {'rmax': 0.1}, 'configuration': {'PW:TIME': 1.0}},
+        {'test': 'IS', 'limits': {'rmin': 1e6}, 'configuration': {'I5:UNOM': 500}},
+        {'test': 'HV', 'configuration': {'H5:UNOM': 1250, 'H5:IMAX': 0.003}},
+        {'test': 'LC'},
+        {'test': 'FT', 'limits': {'pausa': 0.0}}], sequences.RUN_ALL, 'bench')
+    return lambda: seq(lg)
+
+# ########################## #
+#        Measurement         #
+# ########################## #
+
+def measure(fn, repeat=5, minTime=0.05):
+    # like timeit.autorange: grows the number of loops until a repeat lasts minTime
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for i in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= minTime or loops >= 1000000:
+            break
+        loops *= 10 if elapsed < minTime / 10 else 2
+    timings = [elapsed / loops]
+    for r in range(repeat - 1):
+        t0 = time.perf_counter()
+        for i in range(loops):
+            fn()
+        timings.append((time.perf_counter() - t0) / loops)
+    timings.sort()
+    return {'best': timings[0], 'median': timings[len(timings) // 2], 'loops': loops, 'repeat': repeat}
+
+def run(options):
+    results = {}
+    for name, endToEnd, setup in CASES:
+        if options.filter and options.filter not in name:
+            continue
+        if endToEnd and options.skip_e2e:
+            continue
+        fn = setup(options)
+        results[name] = measure(fn, options.repeat, options.min_time)
+        print("%-22s %12.3f us/op" % (name, results[name]['best'] * 1e6))
+    report = {'meta': {'time': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': options.latency,
+        'testTime': options.testTime
+        },
+        'cases': results
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+def compare(options):
+    # regression: the best time grew by more than threshold (0.1 = 10%)
+    with open(options.baseline) as f:
+        old = json.load(f)
+    with open(options.candidate) as f:
+        new = json.load(f)
+    for key in ('latency', 'testTime', 'python'):
+        if old['meta'].get(key) != new['meta'].get(key):
+            print("warning: different %s (%s / %s)" % (key, old['meta'].get(key), new['meta'].get(key)))
+    old = old['cases']
+    new = new['cases']
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        ratio = new[name]['best'] / old[name]['best'] if old[name]['best'] else 1.0
+        flag = ""
+        if ratio > 1 + options.threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - options.threshold:
+            flag = "faster"
+        print("%-22s %12.3f %12.3f us/op  %6.2fx  %s" % (name, old[name]['best'] * 1e6, new[name]['best'] * 1e6, ratio, flag))
+    for name in sorted(set(old) ^ set(new)):
+        print("%-22s only in %s" % (name, options.baseline if name in old else options.candidate))
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m serialLG1800.bench", description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help="run the benchmarks")
+    p.add_argument('-o', '--output', help="JSON file for the results")
+    p.add_argument('-k', '--filter', help="only the cases whose name contains this text")
+    p.add_argument('--latency', type=float, default=0.0, help="reply latency of the fake instrument, seconds")
+    p.add_argument('--testTime', type=float, default=0.0, help="duration of every MEAS test of the fake instrument")
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--min-time', type=float, default=0.05, help="minimum duration of a repeat, seconds")
+    p.add_argument('--skip-e2e', action='store_true', help="only the host side cases")
+    p = sub.add_parser('compare', help="compare two result files")
+    p.add_argument('baseline')
+    p.add_argument('candidate')
+    p.add_argument('--threshold', type=float, default=0.1)
+    options = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    if options.command == 'run':
+        return run(options)
+    if options.command == 'compare':
+        return compare(options)
+    parser.print_help()
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    decoding.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+''' Lookup tables for the status register (*STA?) and a bit view of the inputs (*INPW?),
+built once so that the polling loop doesn't allocate.
+Status register, unsigned short int 0-255:
+high nibble: Activity
+low nibble: Test end result
+'Test end' bits have meaning only if 'Activity' bits are set to 'Test finished' (1000).
+'''
+
+# activity codes
+IDLE = 0
+STARTING = 1
+PREPARING = 2
+RAMP_UP = 3
+TEST_END = 4
+RAMP_DOWN = 5
+MEASURING = 6
+FINISHED = 8
+
+ACTIVITY_DESCRIPTION = {
+IDLE : 'idle', STARTING : 'test starting', PREPARING : 'test preparing', RAMP_UP : 'ramp up',
+MEASURING : 'measuring', RAMP_DOWN : 'ramp down', TEST_END : 'test end', FINISHED : 'test finished'
+}
+
+TESTEND_DESCRIPTION = {
+0 : 'normal', 1 : 'stop button', 2 : 'HW test - high current', 3 : 'PW test - disconnected',
+4 : 'PW disconnected/U low', 5 : 'SK control released', 6 : 'LC test - high current',
+7 : 'extension failed', 8 : 'HV test - low current', 9 : 'PW test - U > U max',
+10 : 'Over Arc max', 11 : 'Temp err', 12 : 'Hardware err', 15 : 'after syst:HALT'
+}
+
+# binary strings of the nibbles, as LG1800.activity/testEnd have always been ('1000')
+NIBBLE_BITS = tuple(bin(i)[2:] for i in range(16))
+
+# 256 entry tables indexed by the raw status register
+STATUS_ACTIVITY = tuple((raw >> 4) & 15 for raw in range(256))
+STATUS_TESTEND = tuple(raw & 15 for raw in range(256))
+STATUS_ACTIVITY_BITS = tuple(NIBBLE_BITS[a] for a in STATUS_ACTIVITY)
+STATUS_TESTEND_BITS = tuple(NIBBLE_BITS[t] for t in STATUS_TESTEND)
+STATUS_ACTIVITY_DESCRIPTION = tuple(ACTIVITY_DESCRIPTION.get(a, 'unknown') for a in STATUS_ACTIVITY)
+STATUS_TESTEND_DESCRIPTION = tuple(TESTEND_DESCRIPTION.get(t, 'unknown') for t in STATUS_TESTEND)
+
+
+class InputBits(object):
+    """ The 16 inputs as a single word, indexed like the list LG1800.inputs
+    used to be: inputs[0] is input 01, inputs[15] is input 16.
+    """
+    __slots__ = ('raw',)
+
+    def __init__(self, raw=0):
+        self.raw = raw
+
+    def __len__(self):
+        return 16
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [(self.raw >> b) & 1 for b in range(16)[i]]
+        if i < 0:
+            i += 16
+        if not 0 <= i < 16:
+            raise IndexError("input index out of range")
+        return (self.raw >> i) & 1
+
+    def __setitem__(self, i, value):
+        if i < 0:
+            i += 16
+        if not 0 <= i < 16:
+            raise IndexError("input index out of range")
+        if value:
+            self.raw |= 1 << i
+        else:
+            self.raw &= ~(1 << i)
+
+    def __iter__(self):
+        raw = self.raw
+        for b in range(16):
+            yield (raw >> b) & 1
+
+    def __eq__(self, other):
+        if isinstance(other, InputBits):
+            return self.raw == other.raw
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "InputBits(%s)" % list(self)
+
+    def tolist(self):
+        return list(self)
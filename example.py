@@ -4,6 +4,7 @@ lgport = 'socket://192.168.0.8:3800'
 lg = None
 
 def initLG():
+    global lg
     lg = slg.LG1800(lgport)
     
 def fetchInputs():
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    fakeLG.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import random
+import time
+from collections import deque
+
+# values returned by the READ:* requests
+DEFAULT_VALUES = {
+'READ:CT:CURR?' : 0.3,
+'READ:PW:CURR?' : 10.0, 'READ:PW:VOLT?' : 0.5, 'READ:PW:RES?' : 0.05,
+'READ:I5:VOLT?' : 500.0, 'READ:I5:VOLTMAX?' : 505.0, 'READ:I5:VOLTMIN?' : 495.0,
+'READ:I5:CURR?' : 5.0e-6, 'READ:I5:CURRMAX?' : 6.0e-6, 'READ:I5:CURRMIN?' : 4.0e-6,
+'READ:I5:RES?' : 1.0e8, 'READ:I5:RESMAX?' : 1.2e8, 'READ:I5:RESMIN?' : 0.8e8,
+'READ:H5:VOLT?' : 1250.0, 'READ:H5:VOLTMAX?' : 1260.0, 'READ:H5:VOLTMIN?' : 1240.0,
+'READ:H5:CURR?' : 1.0e-3, 'READ:H5:CURRMAX?' : 1.1e-3, 'READ:H5:CURRMIN?' : 0.9e-3,
+'READ:H5:ARC?' : 0.0, 'READ:H5:ARCMAX?' : 0.0, 'READ:H5:ARCMIN?' : 0.0,
+'READ:F1:CURR?' : 2.0, 'READ:F1:CURRMAX?' : 2.1, 'READ:F1:CURRMIN?' : 1.9,
+'READ:L1:VOLT?' : 253.0, 'READ:L1:VOLTMAX?' : 254.0, 'READ:L1:VOLTMIN?' : 252.0,
+'READ:L1:CURR?' : 2.0e-4, 'READ:L1:CURRMAX?' : 2.2e-4, 'READ:L1:CURRMIN?' : 1.8e-4
+}
+
+# (fraction of the test time, activity) as reported by *STA?
+PHASES = ((0.1, 2), (0.3, 3), (0.8, 6), (1.0, 5))
+
+class FakeLG1800(object):
+    """ Loopback stand-in for an LG1800 connected through pySerial, for benchmarks
+    and for trying sequences without a bench: LG1800(FakeLG1800(), audio=False).
+    latency: seconds before every reply
+    testTime: duration of every MEAS:* test
+    noise: relative gaussian noise added to the READ:* values
+    """
+
+    def __init__(self, latency=0.0, testTime=0.05, values=None, inputs=0, temperature=25, noise=0.0, seed=None):
+        self.port = 'fake://lg1800'
+        self.timeout = 1
+        self.is_open = True
+        self.latency = latency
+        self.testTime = testTime
+        self.values = dict(DEFAULT_VALUES)
+        if values:
+            self.values.update(values)
+        self.inputs = inputs
+        self.temperature = temperature
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.register = 0
+        self.replies = deque()
+        self.errors = deque()
+        self.testStart = None
+        self.commands = 0
+
+    def write(self, data):
+        for line in bytes(data).split(b'\n'):
+            if line:
+                self.handle(line.decode('UTF-8').strip())
+        return len(data)
+
+    def readline(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.replies:
+            return self.replies.popleft()
+        # timeout
+        return b''
+
+    def close(self):
+        self.is_open = False
+
+    def serve(self, link):
+        # answers the requests arriving on the device end of transport.memoryPair()
+        # until the link is closed, e.g. from a thread
+        while not link.closed:
+            frame = link.readFrame()
+            if not frame:
+                continue
+            self.write(frame)
+            if self.replies and self.latency:
+                time.sleep(self.latency)
+            while self.replies:
+                link.writeFrames(self.replies.popleft())
+
+    def reply(self, text):
+        self.replies.append(b'>' + text.encode('UTF-8') + b'\r\n')
+
+    def status(self):
+        if self.testStart is None:
+            return 0
+        elapsed = (time.monotonic() - self.testStart) / self.testTime if self.testTime else 1.0
+        for limit, activity in PHASES:
+            if elapsed < limit:
+                return activity << 4
+        return 8 << 4
+
+    def handle(self, cmd):
+        self.commands += 1
+        if cmd == '*IDN?':
+            self.reply('SPS electronic LG1800B,Ver. 1.00,S/N:FAKE0001')
+        elif cmd == '*ERR?':
+            if self.errors:
+                self.reply(self.errors.popleft())
+            else:
+                self.reply('0,No error')
+        elif cmd == '*STA?':
+            self.reply(str(self.status()))
+        elif cmd == '*INPW?':
+            self.reply(str(self.inputs))
+        elif cmd.startswith('*INP '):
+            self.reply(str((self.inputs >> (int(cmd[5:7]) - 1)) & 1))
+        elif cmd == 'SYST:HVG18:T?':
+            self.reply(str(self.temperature))
+        elif cmd.startswith('*SET '):
+            clear, set_ = cmd[5:].split(';')
+            self.register = (self.register & ~int(clear)) | int(set_)
+        elif cmd == '*RST':
+            # power-on state: every contactor released
+            self.register = 0
+        elif cmd.startswith('MEAS:'):
+            self.testStart = time.monotonic()
+        elif cmd in self.values:
+            value = self.values[cmd]
+            if self.noise:
+                value = self.random.gauss(value, abs(value) * self.noise)
+            self.reply("%.4E" % value)
+        elif cmd.endswith('?'):
+            self.reply('0')
+        elif not (cmd.startswith(('CONF:', 'DISP:', 'SYST:')) or cmd in ('*CLS', '*RST', '*CEQ', '*LLO')):
+            self.errors.append('3,Wrong command')
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    limits.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+# Pass/fail rules of the LG1800.run* methods.
+# The evaluate* functions judge a single measurement and are used by the run* methods,
+# the judge* functions apply the same rules to arrays of measurements.
+# Reasons are returned as an index into REASONS[test], 0 meaning passed.
+
+REASONS = {
+'CT' : ("", "Open circuit", "Short circuit"),
+'PW' : ("", "Resistance lower than Rmin", "Resistance greater than Rmax"),
+'IS' : ("", "Resistance lower than Rmin"),
+'HV' : ("", "Current lower than Imin", "Current greater than Imax"),
+'FT' : ("", "current lower than Imin", "current greater than Imax"),
+'LC' : ("",)
+}
+
+# default limits, the same of the run* methods
+DEFAULTS = {
+'CT' : {'absolute': False, 'checkimax': False, 'imin': 0, 'imax': 0.6, 'nom': 0.3, 'suptolerance': 20, 'inftolerance': 20},
+'PW' : {'rmin': 0, 'rmax': 1},
+'IS' : {'rmin': 0},
+'HV' : {'imin': 0, 'imax': 0.003},
+'FT' : {'imin': 0, 'imax': 10, 'autotest': False},
+'LC' : {}
+}
+
+def ctLimits(absolute, imin, imax, nom, suptolerance, inftolerance):
+    # se il test viene eseguito con valutazione dello scarto percentuale rispetto ad un valore di riferimento
+    if not absolute:
+        imin = nom*(100-inftolerance)/100
+        imax = nom*(100+suptolerance)/100
+    return (imin, imax)
+
+def evaluateCT(current, absolute=False, checkimax=False, imin=0, imax=0.6, nom=0.3, suptolerance=20, inftolerance=20):
+    imin, imax = ctLimits(absolute, imin, imax, nom, suptolerance, inftolerance)
+    if current < imin:
+        return (False, REASONS['CT'][1])
+    elif current > imax:
+        if checkimax:
+            return (False, REASONS['CT'][2])
+    return (True, "")
+
+def evaluatePW(resistance, rmin=0, rmax=1):
+    if resistance < rmin:
+        return (False, REASONS['PW'][1])
+    elif resistance > rmax:
+        return (False, REASONS['PW'][2])
+    return (True, "")
+
+def evaluateIS(resistance, rmin=0):
+    if resistance < rmin:
+        return (False, REASONS['IS'][1])
+    return (True, "")
+
+def evaluateHV(current, imin=0, imax=0.003):
+    if current < imin:
+        return (False, REASONS['HV'][1])
+    elif current > imax:
+        return (False, REASONS['HV'][2])
+    return (True, "")
+
+def evaluateFT(currentFwd, currentRev, imin=0, imax=10, autotest=False):
+    # in autotest the forward phase is skipped, only the reverse current counts
+    if not autotest:
+        minCurrentMeasured = min(currentFwd, currentRev)
+        maxCurrentMeasured = max(currentFwd, currentRev)
+    else:
+        minCurrentMeasured = currentRev
+        maxCurrentMeasured = currentRev
+    if minCurrentMeasured < imin:
+        return (False, REASONS['FT'][1])
+    elif maxCurrentMeasured > imax:
+        return (False, REASONS['FT'][2])
+    return (True, "")
+
+def evaluateLC():
+    # no limits for the leakage current test (yet)
+    return (True, "")
+
+def band(values, low, high, lowCode, highCode, checkHigh=True):
+    # reason codes for a value that must stay in [low, high]; the low check wins, as in the run* methods
+    values = np.asarray(values, dtype=np.float64)
+    reason = np.zeros(values.shape, dtype=np.int8)
+    if checkHigh:
+        reason[values > high] = highCode
+    reason[values < low] = lowCode
+    return (reason == 0, reason)
+
+def judgeCT(current, absolute=False, checkimax=False, imin=0, imax=0.6, nom=0.3, suptolerance=20, inftolerance=20):
+    imin, imax = ctLimits(absolute, imin, imax, nom, suptolerance, inftolerance)
+    return band(current, imin, imax, 1, 2, checkimax)
+
+def judgePW(resistance, rmin=0, rmax=1):
+    return band(resistance, rmin, rmax, 1, 2)
+
+def judgeIS(resistance, rmin=0):
+    return band(resistance, rmin, None, 1, 0, False)
+
+def judgeHV(current, imin=0, imax=0.003):
+    return band(current, imin, imax, 1, 2)
+
+def judgeFT(currentFwd, currentRev, imin=0, imax=10, autotest=False):
+    # autotest: a bool or an array of bools, one per measurement
+    currentRev = np.asarray(currentRev, dtype=np.float64)
+    autotest = np.asarray(autotest, dtype=np.bool_)
+    if autotest.all():
+        low = high = currentRev
+    else:
+        currentFwd = np.asarray(currentFwd, dtype=np.float64)
+        low = np.where(autotest, currentRev, np.minimum(currentFwd, currentRev))
+        high = np.where(autotest, currentRev, np.maximum(currentFwd, currentRev))
+    reason = np.zeros(currentRev.shape, dtype=np.int8)
+    reason[high > imax] = 2
+    reason[low < imin] = 1
+    return (reason == 0, reason)
+
+def judgeLC(current):
+    current = np.asarray(current)
+    return (np.ones(current.shape, dtype=np.bool_), np.zeros(current.shape, dtype=np.int8))
+
+# measured fields used by each judge* function
+INPUTS = {
+'CT' : ('current',),
+'PW' : ('resistance',),
+'IS' : ('resistance',),
+'HV' : ('current',),
+'FT' : ('currentFwd', 'currentRev'),
+'LC' : ('current',)
+}
+JUDGES = {'CT': judgeCT, 'PW': judgePW, 'IS': judgeIS, 'HV': judgeHV, 'FT': judgeFT, 'LC': judgeLC}
+
+def rejudge(batch, limits=None):
+    ''' Applies a set of limits to a results.ResultBatch.
+    Returns (result, reason) arrays, reason being codes into batch.reasons.
+    Failures that don't come from the limits (the vibes test of FT) are kept.
+    '''
+    test = batch.test
+    kwargs = dict(DEFAULTS[test])
+    if limits:
+        kwargs.update(limits)
+    if test == 'FT':
+        # the rows measured in autotest have no forward current, whatever the limits say
+        kwargs['autotest'] = batch.column('autotest') | bool(kwargs['autotest'])
+    arrays = [batch.column(f) for f in INPUTS[test]]
+    result, code = JUDGES[test](*arrays, **kwargs)
+    table = np.array([batch.reasonCode(r) for r in REASONS[test]], dtype=np.int16)
+    reason = table[code]
+    # a failure recorded with a reason that is not a limit reason stays a failure
+    old = batch.column('reason')
+    limitCodes = table[1:]
+    other = (~batch.column('result')) & (old != 0) & ~np.isin(old, limitCodes)
+    if other.any():
+        result = result & ~other
+        reason = np.where(other, old, reason)
+    return (result, reason)
+
+def whatIf(batch, tables):
+    ''' Compares sets of limits on the same results.
+    tables: {name: limits}; returns {name: {'passRate', 'failed', 'reasons': {reason: count}}}
+    '''
+    study = {}
+    for name, limits in tables.items():
+        result, reason = rejudge(batch, limits)
+        codes, counts = np.unique(reason[~result], return_counts=True)
+        study[name] = {'passRate': float(np.count_nonzero(result)) / len(batch) if len(batch) else 0.0,
+        'failed': int(len(result) - np.count_nonzero(result)),
+        'reasons': dict((batch.reasons[c], int(n)) for c, n in zip(codes, counts))
+        }
+    return study
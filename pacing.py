@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    pacing.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import logging
+import time
+
+# error codes of *ERR? meaning that the device didn't keep up with the link:
+# missing end character, queue overflow
+LINK_ERRORS = (2, 200)
+
+class LinkPacer:
+    """ Keeps the minimum idle time between two commands of the same class.
+    The LG1800 sometimes drops a reply when it is hammered with requests.
+    The gap is measured from the end of the previous exchange (the reply of a
+    query, the write of the other commands) to the next command.
+    With adaptive=True the query gap is calibrated on the link at connect time
+    and every gap is widened when replies go missing or the device reports
+    LINK_ERRORS; with adaptive=False every wait() sleeps the whole gap, like the
+    old fixed snooze, and the gaps never change.
+    Command classes:
+    switch   *SET commands driving the relays of the test bench, never below
+             relaySettle: the contactors need that time whatever the link
+    query    requests with a reply (*STA?, READ:..., ...)
+    display  DISP:ROW commands
+    """
+
+    CLASSES = ('switch', 'query', 'display')
+
+    def __init__(self, gap=0.1, minGap=0.01, maxGap=1.0, backoff=2.0, recover=20, relaySettle=0.1, adaptive=True):
+        # gap: starting value for every class, kept until calibrate() is run
+        self.minGap = minGap
+        self.maxGap = maxGap
+        self.backoff = backoff
+        self.recover = recover
+        self.adaptive = adaptive
+        self.floor = {'switch': max(minGap, relaySettle), 'query': minGap, 'display': minGap}
+        self.gap = {}
+        self.calibrated = {}
+        self.last = {}
+        self.failures = {}
+        self.successes = {}
+        self.streak = {}
+        for c in self.CLASSES:
+            self.gap[c] = max(self.floor[c], gap)
+            self.calibrated[c] = self.gap[c]
+            self.last[c] = 0.0
+            self.failures[c] = 0
+            self.successes[c] = 0
+            self.streak[c] = 0
+
+    def commandClass(self, text):
+        if text.startswith('*SET'):
+            return 'switch'
+        if text.startswith('DISP'):
+            return 'display'
+        return 'query'
+
+    def mark(self, cmdClass):
+        # an exchange of this class has just ended
+        self.last[cmdClass] = time.monotonic()
+
+    def wait(self, cmdClass):
+        if not self.adaptive:
+            time.sleep(self.gap[cmdClass])
+            return
+        # sleeps only for what is left of the gap since the last exchange of this class
+        remaining = self.last[cmdClass] + self.gap[cmdClass] - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def success(self, cmdClass):
+        self.successes[cmdClass] += 1
+        self.streak[cmdClass] += 1
+        # after a long enough run without losses move back towards the calibrated gap
+        if self.adaptive and self.streak[cmdClass] >= self.recover and self.gap[cmdClass] > self.calibrated[cmdClass]:
+            self.gap[cmdClass] = max(self.calibrated[cmdClass], self.gap[cmdClass] / self.backoff)
+            self.streak[cmdClass] = 0
+            logging.debug("pacing %s: gap reduced to %.3f s", cmdClass, self.gap[cmdClass])
+
+    def failure(self, cmdClass):
+        self.failures[cmdClass] += 1
+        self.streak[cmdClass] = 0
+        if not self.adaptive:
+            return
+        self.gap[cmdClass] = min(self.maxGap, max(self.gap[cmdClass], self.minGap) * self.backoff)
+        logging.warning("pacing %s: device not keeping up, gap increased to %.3f s", cmdClass, self.gap[cmdClass])
+
+    def setGap(self, cmdClass, gap):
+        # fixes the gap of a class from a measurement (or by hand)
+        gap = min(self.maxGap, max(self.floor[cmdClass], gap))
+        self.gap[cmdClass] = gap
+        self.calibrated[cmdClass] = gap
+
+    def probe(self, lg, samples):
+        # samples status requests at the current query gap, False at the first lost reply
+        for i in range(samples):
+            self.wait('query')
+            reply = lg.send_receive("*STA?")
+            try:
+                int(reply)
+            except ValueError:
+                return False
+            if not lg.connected:
+                return False
+        return True
+
+    def calibrate(self, lg, samples=10, margin=1.5):
+        ''' Looks for the smallest query gap at which the device still answers:
+        starting from the current gap, samples status requests are sent at each
+        gap, halved while no reply is lost, down to minGap.
+        The query gap becomes margin * the smallest gap without losses.
+        The switch gap (relaySettle) and the display gap are not calibrated,
+        DISP:ROW has no reply to check.
+        Returns False if the device lost replies already at the starting gap,
+        the gaps are then widened.
+        '''
+        if not self.adaptive:
+            return True
+        start = self.gap['query']
+        best = None
+        gap = start
+        while gap >= self.minGap:
+            self.gap['query'] = gap
+            if not self.probe(lg, samples):
+                # a reply went missing: let the device recover at a safe pace
+                time.sleep(self.maxGap)
+                self.gap['query'] = start
+                lg.connected = True
+                if not self.probe(lg, 1):
+                    lg.connected = False
+                    logging.warning("pacing: connection lost during calibration")
+                break
+            best = gap
+            gap /= self.backoff
+        if best is None:
+            logging.warning("pacing: replies lost at %.3f s, widening the gaps", start)
+            for c in self.CLASSES:
+                self.gap[c] = min(self.maxGap, self.gap[c] * self.backoff)
+            return False
+        self.setGap('query', min(start, best * margin))
+        logging.info("pacing calibrated: smallest safe query gap %.4f s, gaps %s", best, self.stats())
+        return True
+
+    def stats(self):
+        return dict((c, {'gap': self.gap[c],
+            'calibrated': self.calibrated[c],
+            'failures': self.failures[c],
+            'successes': self.successes[c]}) for c in self.CLASSES)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    profiles.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import json
+import logging
+import os
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# recipe formatted to tell the version of LG1800.formatConfiguration: its output
+# is part of the cache key, so that the blobs written by another version are not reused
+CANARY = (('PW:TIME', 12.5), ('PW:IMIN', 10), ('PW:MODE', 'OFF'), ('I5:RMIN', 5e6), ('I5:SKINP', 3),
+    ('H5:IMAX', 0.003))
+
+class Profile(object):
+    """ A product recipe compiled into the block of CONF commands sent to the device. """
+
+    def __init__(self, name, key, payload):
+        self.name = name
+        self.key = key
+        self.payload = payload
+
+    def commands(self):
+        return [line.decode('UTF-8') for line in self.payload.split(b'\n') if line]
+
+    def __len__(self):
+        return self.payload.count(b'\n')
+
+
+class ProfileStore(object):
+    """ Loads product recipes from JSON/YAML files, validates them once through
+    LG1800.formatConfiguration and keeps the resulting wire blobs in memory
+    and, optionally, in cacheDir.
+    A recipe looks like:
+        {"name": "oven-60",
+         "configuration": {"PW:TIME": 1.0, "I5:UNOM": 1000, "H5:IMAX": 0.003}}
+    the order of the configuration entries is the order in which they are sent.
+    A blob on disk starts with the sha1 of the commands and is checked again
+    (digest and LG1800.valid) when it is read; a damaged blob is rebuilt.
+    """
+
+    def __init__(self, lg, cacheDir=None):
+        self.lg = lg
+        self.cacheDir = cacheDir
+        if cacheDir is not None and not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        self.cache = {}
+        self.profiles = {}
+        self.formatKey = None
+
+    def loadRecipe(self, path):
+        with open(path, 'r') as f:
+            if path.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise ImportError("PyYAML is needed to read " + path)
+                recipe = yaml.safe_load(f)
+            else:
+                recipe = json.load(f)
+        if 'name' not in recipe:
+            recipe['name'] = os.path.splitext(os.path.basename(path))[0]
+        return recipe
+
+    def load(self, path):
+        return self.compile(self.loadRecipe(path))
+
+    def formatterKey(self):
+        if self.formatKey is None:
+            canary = [self.lg.formatConfiguration(par, value, strict=True) for par, value in CANARY]
+            self.formatKey = hashlib.sha1('\n'.join(canary).encode('UTF-8')).hexdigest()
+        return self.formatKey
+
+    def recipeKey(self, configuration):
+        canonical = json.dumps([self.formatterKey(), list(configuration.items())], separators=(',', ':'))
+        return hashlib.sha1(canonical.encode('UTF-8')).hexdigest()
+
+    def compile(self, recipe):
+        configuration = recipe.get('configuration')
+        if not isinstance(configuration, dict):
+            raise ValueError("recipe %s has no configuration" % recipe.get('name'))
+        name = recipe['name']
+        key = self.recipeKey(configuration)
+        payload = self.cache.get(key)
+        if payload is None:
+            payload = self.readCache(key)
+        if payload is None:
+            payload = self.build(name, configuration)
+            self.writeCache(key, payload)
+        self.cache[key] = payload
+        profile = Profile(name, key, payload)
+        self.profiles[name] = profile
+        return profile
+
+    def build(self, name, configuration):
+        lines = []
+        for par, value in configuration.items():
+            try:
+                request = self.lg.formatConfiguration(par, value, strict=True)
+            except (ValueError, TypeError, AttributeError) as e:
+                # unknown parameter or value of the wrong type (e.g. a number for PW:MODE)
+                raise ValueError("recipe %s: invalid parameter %s = %r (%s)" % (name, par, value, e))
+            if request is None:
+                continue
+            if not self.lg.valid(request, "NOREPLY"):
+                raise ValueError("recipe %s: invalid request %s" % (name, request))
+            lines.append(request + '\n')
+        logging.debug("profile %s compiled, %d commands", name, len(lines))
+        return ''.join(lines).encode('UTF-8')
+
+    def cachePath(self, key):
+        return os.path.join(self.cacheDir, key + '.lgp')
+
+    def readCache(self, key):
+        if self.cacheDir is None:
+            return None
+        path = self.cachePath(key)
+        try:
+            with open(path, 'rb') as f:
+                digest = f.readline().rstrip(b'\n')
+                payload = f.read()
+        except IOError:
+            return None
+        if hashlib.sha1(payload).hexdigest().encode('ascii') != digest:
+            logging.warning("profile cache %s is damaged, rebuilding it", path)
+            return None
+        try:
+            lines = payload.decode('UTF-8').split('\n')
+        except UnicodeDecodeError:
+            lines = None
+        # the payload is sent as it is: only single CONF commands, checked as in build()
+        if lines is None or lines[-1] != '' or not all(self.cachedCommand(line) for line in lines[:-1]):
+            logging.warning("profile cache %s holds invalid commands, rebuilding it", path)
+            return None
+        return payload
+
+    def cachedCommand(self, line):
+        return line.startswith("CONF:") and ';' not in line and self.lg.valid(line, "NOREPLY")
+
+    def writeCache(self, key, payload):
+        if self.cacheDir is None:
+            return
+        tmp = self.cachePath(key) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(hashlib.sha1(payload).hexdigest().encode('ascii') + b'\n')
+            f.write(payload)
+        os.replace(tmp, self.cachePath(key))
+
+    def apply(self, profile):
+        # profile: a Profile or the name of a loaded one
+        if not isinstance(profile, Profile):
+            profile = self.profiles[profile]
+        errors = self.lg.sendBulk(profile.payload)
+        if errors:
+            logging.warning("profile %s: %d errors reported by the device", profile.name, errors)
+        else:
+            logging.info("profile %s applied", profile.name)
+        return errors
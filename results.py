@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    results.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import csv
+import time
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import numpy as np
+
+class Result(Mapping):
+    """ Base of the records returned by the LG1800.run* methods.
+    A record behaves like the dict the methods used to return
+    (r['current'], r.get('reason'), dict(r), ...), but keeps its values in slots.
+    Every subclass lists its keys in 'fields', in the order of the old dicts,
+    and the measured values in 'numeric', the yes/no settings of the measure in 'flags'.
+    Only the fields can be set (r['current'] = ...), other keys raise KeyError;
+    json and other code needing a real dict use toDict() (or dict(r)).
+    """
+    __slots__ = ()
+    test = None
+    fields = ()
+    numeric = ()
+    flags = ()
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(self.fields):
+            raise TypeError("%s takes at most %d values" % (type(self).__name__, len(self.fields)))
+        for name in kwargs:
+            if name not in self.fields:
+                raise TypeError("%s has no field %s" % (type(self).__name__, name))
+        # the fields not given are None, like a missing key in the old dicts
+        for name in self.fields[len(args):]:
+            setattr(self, name, kwargs.get(name))
+        for name, value in zip(self.fields, args):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join("%s=%r" % (f, getattr(self, f, None)) for f in self.fields))
+
+    def copy(self):
+        return type(self)(*[getattr(self, f) for f in self.fields])
+
+    def toDict(self):
+        # a plain dict, e.g. for json
+        return dict((f, getattr(self, f)) for f in self.fields)
+
+
+class CTResult(Result):
+    test = 'CT'
+    __slots__ = fields = ('current', 'reason', 'result')
+    numeric = ('current',)
+
+
+class PWResult(Result):
+    test = 'PW'
+    __slots__ = fields = ('current', 'voltageDrop', 'resistance', 'reason', 'result')
+    numeric = ('current', 'voltageDrop', 'resistance')
+
+
+class ISResult(Result):
+    test = 'IS'
+    __slots__ = fields = ('voltage', 'voltMax', 'voltMin', 'current', 'currentMax', 'currentMin',
+        'resistance', 'resistanceMax', 'resistanceMin', 'reason', 'result')
+    numeric = fields[:-2]
+
+
+class HVResult(Result):
+    test = 'HV'
+    __slots__ = fields = ('voltage', 'voltMax', 'voltMin', 'current', 'currentMax', 'currentMin',
+        'arc', 'arcMax', 'arcMin', 'reason', 'result')
+    numeric = fields[:-2]
+
+
+class FTResult(Result):
+    test = 'FT'
+    __slots__ = fields = ('currentFwd', 'currentMaxFwd', 'currentMinFwd', 'currentRev', 'currentMaxRev',
+        'currentMinRev', 'reason', 'result', 'vtr', 'autotest')
+    numeric = fields[:-4]
+    # in autotest there is no forward phase, currentFwd is 0 and is not judged
+    flags = ('autotest',)
+
+
+class LCResult(Result):
+    test = 'LC'
+    __slots__ = fields = ('voltage', 'voltMax', 'voltMin', 'current', 'currentMax', 'currentMin',
+        'reason', 'result')
+    numeric = fields[:-2]
+
+
+RECORDS = dict((c.test, c) for c in (CTResult, PWResult, ISResult, HVResult, FTResult, LCResult))
+
+
+class ResultBatch(object):
+    """ Many results of the same test type stored by column:
+    one float64 array per numeric field, one bool array per flag, the verdict as bool,
+    the reason as a code into self.reasons and the time the result was appended.
+    Fields that are not numbers (the vibes result of FT) are not kept,
+    their effect is already in 'result' and 'reason'.
+    """
+
+    def __init__(self, test, capacity=1024):
+        self.record = RECORDS[test]
+        self.test = test
+        self.n = 0
+        self.reasons = [""]
+        self.reasonCodes = {"": 0}
+        self.columns = {}
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        columns = {}
+        for f in self.record.numeric:
+            columns[f] = np.empty(capacity, dtype=np.float64)
+        for f in self.record.flags:
+            columns[f] = np.empty(capacity, dtype=np.bool_)
+        columns['result'] = np.empty(capacity, dtype=np.bool_)
+        columns['reason'] = np.empty(capacity, dtype=np.int16)
+        columns['time'] = np.empty(capacity, dtype=np.float64)
+        for name, old in self.columns.items():
+            columns[name][:self.n] = old[:self.n]
+        self.columns = columns
+        self.capacity = capacity
+
+    def reasonCode(self, reason):
+        code = self.reasonCodes.get(reason)
+        if code is None:
+            code = len(self.reasons)
+            self.reasons.append(reason)
+            self.reasonCodes[reason] = code
+        return code
+
+    def append(self, result, t=None):
+        # result: a record or a dict with the same keys
+        if self.n == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.n
+        columns = self.columns
+        for f in self.record.numeric:
+            columns[f][i] = result[f]
+        for f in self.record.flags:
+            # missing or None: the flag was not set
+            columns[f][i] = bool(result.get(f))
+        columns['result'][i] = result['result']
+        columns['reason'][i] = self.reasonCode(result['reason'])
+        columns['time'][i] = time.time() if t is None else t
+        self.n += 1
+
+    def extend(self, results):
+        for r in results:
+            self.append(r)
+
+    def __len__(self):
+        return self.n
+
+    def column(self, name):
+        # a view, not a copy
+        return self.columns[name][:self.n]
+
+    def reasonColumn(self):
+        return np.array(self.reasons, dtype=object)[self.column('reason')]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        values = dict((f, float(self.columns[f][i])) for f in self.record.numeric)
+        for f in self.record.flags:
+            values[f] = bool(self.columns[f][i])
+        values['result'] = bool(self.columns['result'][i])
+        values['reason'] = self.reasons[self.columns['reason'][i]]
+        if 'vtr' in self.record.fields:
+            values['vtr'] = None
+        return self.record(**values)
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def where(self, **conditions):
+        ''' Boolean mask of the rows matching all the conditions,
+        e.g. where(result=False, reason="Open circuit")
+        '''
+        mask = np.ones(self.n, dtype=np.bool_)
+        for name, value in conditions.items():
+            if name == 'reason':
+                code = self.reasonCodes.get(value)
+                if code is None:
+                    return np.zeros(self.n, dtype=np.bool_)
+                value = code
+            mask &= self.column(name) == value
+        return mask
+
+    def filter(self, mask):
+        # returns a new batch with the selected rows
+        selected = ResultBatch(self.test, max(1, int(np.count_nonzero(mask))))
+        selected.reasons = list(self.reasons)
+        selected.reasonCodes = dict(self.reasonCodes)
+        for name, col in self.columns.items():
+            values = col[:self.n][mask]
+            selected.columns[name][:len(values)] = values
+        selected.n = int(np.count_nonzero(mask))
+        return selected
+
+    def passRate(self):
+        if self.n == 0:
+            return 0.0
+        return float(np.count_nonzero(self.column('result'))) / self.n
+
+    def toDicts(self):
+        return [r.toDict() for r in self]
+
+    def toCSV(self, path):
+        names = ['time'] + list(self.record.numeric) + list(self.record.flags) + ['reason', 'result']
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(names)
+            reasons = self.reasonColumn()
+            for i in range(self.n):
+                row = [self.columns['time'][i]]
+                row.extend(self.columns[name][i] for name in self.record.numeric)
+                row.extend(int(self.columns[name][i]) for name in self.record.flags)
+                row.append(reasons[i])
+                row.append(int(self.columns['result'][i]))
+                w.writerow(row)
+
+    def save(self, path):
+        arrays = dict((name, self.column(name)) for name in self.columns)
+        np.savez_compressed(path, _reasons=np.array(self.reasons), _test=np.array(self.test), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        batch = cls(str(data['_test']), max(1, len(data['result'])))
+        batch.reasons = [str(r) for r in data['_reasons']]
+        batch.reasonCodes = dict((r, i) for i, r in enumerate(batch.reasons))
+        for name in batch.columns:
+            if name not in data:
+                # saved before the column existed (a flag): not set
+                batch.columns[name][:len(data['result'])] = False
+                continue
+            batch.columns[name][:len(data[name])] = data[name]
+        batch.n = len(data['result'])
+        return batch
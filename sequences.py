@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    sequences.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import logging
+import time
+
+# test type -> LG1800 method
+TESTS = {
+'CT' : 'runCT',
+'PW' : 'runPW',
+'IS' : 'runIS',
+'HV' : 'runHV',
+'FT' : 'runFT',
+'LC' : 'runLC'
+}
+
+FAIL_FAST = 'fail-fast'
+RUN_ALL = 'run-all'
+
+class Sequence(object):
+    """ Declarative test sequence.
+    steps is a list of dicts:
+        {"test": "PW",                          CT|PW|IS|HV|FT|LC
+         "limits": {"rmin": 0, "rmax": 0.1},    keyword arguments of the run* method
+         "configuration": {"PW:TIME": 1.0},     parameters for setConfiguration
+         "outputs": ["230V"],                   outputFunctional keywords set before the test
+         "mains": "230V", "capacitor": "20uf"}  used by runFT
+    Only the configuration values that change between a step and the previous ones
+    are sent, and while the sequence runs the LG1800 skips the output and
+    configuration requests that would not change the state of the device
+    (the run* methods reset the outputs themselves before and after the test).
+    policy: 'fail-fast' stops at the first failed test, 'run-all' runs every step.
+    """
+
+    def __init__(self, steps, policy=FAIL_FAST, name=None):
+        if policy not in (FAIL_FAST, RUN_ALL):
+            raise ValueError("unknown policy " + str(policy))
+        for step in steps:
+            if step.get('test') not in TESTS:
+                raise ValueError("unknown test " + str(step.get('test')))
+        self.steps = steps
+        self.policy = policy
+        self.name = name
+        self.actions = self.plan()
+
+    @classmethod
+    def fromDict(cls, d):
+        return cls(d['steps'], d.get('policy', FAIL_FAST), d.get('name'))
+
+    def plan(self):
+        ''' Returns, for every step, the configuration and output transitions
+        needed on top of the state left by the previous steps.
+        '''
+        actions = []
+        configuration = {}
+        for step in self.steps:
+            changed = []
+            for par, value in step.get('configuration', {}).items():
+                if configuration.get(par) != value:
+                    configuration[par] = value
+                    changed.append((par, value))
+            # the run* methods move some of the contactors themselves, so the redundant
+            # output requests are filtered at run time against LG1800.outputRegister
+            actions.append({'test': step['test'],
+            'configuration': changed,
+            'outputs': list(step.get('outputs', [])),
+            'limits': step.get('limits', {})
+            })
+        return actions
+
+    def __call__(self, lg):
+        return self.run(lg)
+
+    def run(self, lg):
+        t0 = time.monotonic()
+        elide = (lg.elideOutputs, lg.elideConfiguration)
+        lg.elideOutputs = True
+        lg.elideConfiguration = True
+        results = []
+        passed = True
+        try:
+            for step, action in zip(self.steps, self.actions):
+                for par, value in action['configuration']:
+                    lg.setConfiguration(par, value)
+                for keyword in action['outputs']:
+                    lg.outputFunctional(keyword)
+                if 'mains' in step:
+                    lg.mains = step['mains']
+                if 'capacitor' in step:
+                    lg.capacitor = step['capacitor']
+                result = getattr(lg, TESTS[action['test']])(**action['limits'])
+                results.append((action['test'], result))
+                if not result['result']:
+                    passed = False
+                    logging.info("sequence %s: %s failed, %s", self.name, action['test'], result['reason'])
+                    if self.policy == FAIL_FAST:
+                        break
+                if not lg.connected:
+                    passed = False
+                    logging.warning("sequence %s: connection lost during %s", self.name, action['test'])
+                    break
+            # safe condition at the end of the sequence
+            lg.outputFunctional("OFF")
+            lg.outputFunctional("0uf")
+        finally:
+            lg.elideOutputs, lg.elideConfiguration = elide
+        return {'name': self.name,
+        'result': passed,
+        'steps': results,
+        'duration': time.monotonic() - t0
+        }
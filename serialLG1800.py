@@ -24,10 +24,15 @@ __license__ = "MIT"
 #     DEALINGS IN THE SOFTWARE.
 
 import logging
-import serial
 import time
 import sys
+from collections import Counter, deque
 from . import vibes
+from . import pacing
+from . import limits
+from . import decoding
+from . import transport
+from .results import CTResult, PWResult, ISResult, HVResult, FTResult, LCResult
 # import pyaudio
 
 class LG1800(object):
@@ -43,9 +48,27 @@ class LG1800(object):
     def send(self, text):
         # controlla solo la lunghezza del comando, l'assenza di ";", la formattazione delle cifre e dei valori binari
         if self.valid(text,"NOREPLY"):
+            if text.startswith("MEAS:"):
+                # used by the live streaming to know what is being measured
+                self.currentMeas = text[5:]
+            elif text.startswith("CONF:") and text.endswith(":DEF"):
+                # the parameters of the test are back to their defaults: forget what we set
+                prefix = text[5:-3]
+                for par in [p for p in self.configuration if p.startswith(prefix)]:
+                    del self.configuration[par]
+            elif text == "*RST":
+                # outputs and configuration are back to the power-on state
+                self.configuration = {}
+                self.outputKnown = 0
             try:
-                self.s.write(bytes(text + '\n', 'UTF-8'))
-                self.fetchERRqueue()
+                self.s.writeFrames(self.encoder.frame(text))
+                cmdClass = self.pacer.commandClass(text)
+                self.pacer.mark(cmdClass)
+                # the error queue tells if the device kept up with the link
+                if self.fetchERRqueue() in pacing.LINK_ERRORS or not self.connected:
+                    self.pacer.failure(cmdClass)
+                else:
+                    self.pacer.success(cmdClass)
             except:
                 logging.warning("Errore nell'invio della richiesta: " + text, exc_info=True)
                 self.connected = False
@@ -55,21 +78,28 @@ class LG1800(object):
     def send_receive(self, text):
         if self.valid(text,"REPLY"):
             try:
-                self.s.write(bytes(text + '\n', 'UTF-8'))
+                self.s.writeFrames(self.encoder.frame(text))
                 try:
-                    response = self.s.readline()
+                    response = self.s.readFrame()
+                    self.pacer.mark('query')
                     # unicode: 60(<) 61(=) 62(>)
                     if response[0] in (60,61,62):
+                        self.pacer.success('query')
                         return response[1:]
                     if response == None:
                         logging.warning("ricevuta risposta anomala")
                         response = b'0'
+                    self.pacer.success('query')
                     return response
                 except:
                     e = sys.exc_info()
                     logging.error("Errore nella lettura della porta seriale", exc_info=True)
                     logging.error(e)
-                    self.fetchERRqueue()
+                    self.pacer.mark('query')
+                    self.pacer.failure('query')
+                    # no *ERR? request from here: on a dead link it would fail
+                    # again and recurse, the next send() reads the queue anyway
+                    self.resync()
                     self.connected = False
                     response = b'0'
                     return response
@@ -131,52 +161,100 @@ class LG1800(object):
         '''
         lserr = rawERR.split(b',')
         nerrore = lserr[0]
-        msgerrore = lserr[1]
+        # the message is missing when the request failed (send_receive returns b'0')
+        msgerrore = lserr[1] if len(lserr) > 1 else b''
         return(nerrore, msgerrore)
         
     def fetchERRqueue(self):
         oldestError = self.decodeERR(self.send_receive("*ERR?"))
         if int(oldestError[0]) != 0:
             logging.debug("trovato un errore %s - %s",oldestError[0] , oldestError[1])
+            self.counters['errors'] += 1
+            self.errorCodes[int(oldestError[0])] += 1
+            self.errorLog.append((time.time(), int(oldestError[0]), oldestError[1].strip().decode('latin_1')))
             #self.fetchERRqueue()
+        return int(oldestError[0])
+
+    def resync(self):
+        # a reply went missing: drop whatever is still in the input buffer so that
+        # the next reply belongs to the next request
+        self.counters['resyncs'] += 1
+        if self.s is not None:
+            try:
+                self.s.flush()
+            except:
+                logging.warning("Errore nello svuotamento del buffer di ricezione", exc_info=True)
+
+    def drainERRqueue(self, maxEntries=32):
+        # reads the error queue until it is empty, returns the number of errors found
+        found = 0
+        for i in range(maxEntries):
+            if self.fetchERRqueue() == 0:
+                break
+            found += 1
+        return found
+
+    def sendBulk(self, payload):
+        ''' Writes a precompiled block of newline terminated commands
+        (see profiles.ProfileStore) with a single write, then empties the error queue.
+        The commands must have been validated when the block was built.
+        Returns the number of errors reported by the device.
+        '''
+        try:
+            self.s.writeFrames(payload)
+            self.pacer.mark('query')
+        except:
+            logging.warning("Errore nell'invio di un blocco di comandi", exc_info=True)
+            self.connected = False
+            self.configuration = {}
+            return -1
+        for line in payload.decode('UTF-8').splitlines():
+            if line.startswith("CONF:"):
+                self.configuration[line[5:].split(" ")[0]] = line
+        errors = self.drainERRqueue(payload.count(b'\n') + 1)
+        if errors:
+            # we can't tell which parameter was refused
+            self.configuration = {}
+        return errors
     
     def connect(self, port):
-        # there are two types of connection: serial over RS232 or over TCP/IP. 
-        # PySerial can handle both types
-        self.s = None
-        if ('COM' in port) or ('tty' in port):
+        # serial over RS232, TCP/IP or any other link of transport.py
+        # the device may have been restarted: forget what we know about its state
+        self.outputRegister = 0
+        self.outputKnown = 0
+        self.configuration = {}
+        if self.s is not None and port == self.port:
+            link = self.s
+            opening = link.reconnect
+        else:
+            if self.s is not None:
+                # release the old link (a COM port can't be opened twice)
+                try:
+                    self.s.close()
+                except:
+                    logging.warning("Errore nella chiusura della connessione precedente", exc_info=True)
+            link = transport.openTransport(port)
+            opening = link.open
+        self.s = link
+        self.port = port
+        try:
+            opening()
+        except IOError:
+            if not getattr(link, 'local', False):
+                logging.error("Errore nel tentativo di stabilire una connessione con %s.", link, exc_info=True)
+                return 0
             # TODO: testare la connesione RS232 con un apperecchio
-            self.s = serial.Serial()
-            self.s.port = port
-            self.s.timeout = 1
+            logging.error("Errore nel tentativo di stabilire una connessione seriale. Nuovo tentativo tra 30 secondi.", exc_info=True)
+            logging.info('In atesa di connessione al LG1800. Nuovo tentativo tra 30 secondi.')
+            time.sleep(28)
             try:
-                self.s.open()
-                if self.s.is_open:
-                    logging.info("connected to serial port %s", port)
-                    self.connected = True
-                    return 1
-            except serial.SerialException:
+                link.open()
+            except IOError:
                 logging.error("Errore nel tentativo di stabilire una connessione seriale. Nuovo tentativo tra 30 secondi.", exc_info=True)
-                logging.info('In atesa di connessione al LG1800. Nuovo tentativo tra 30 secondi.')
-                time.sleep(28)
-                try:
-                    self.s.open()
-                    if self.s.is_open:
-                        logging.info("connected to serial port %s", port)
-                        self.connected = True
-                        return 1
-                except serial.SerialException:
-                    logging.error("Errore nel tentativo di stabilire una connessione seriale. Nuovo tentativo tra 30 secondi.", exc_info=True)
-                    return 0
-        else:
-            try:
-                self.s = serial.serial_for_url(port, timeout=1)
-                logging.info("connected to serial port %s", port)
-                self.connected = True
-                return 1
-            except serial.SerialException:
-                logging.error("Errore nel tentativo di stabilire una connessione seriale-ethernet.", exc_info=True)
                 return 0
+        logging.info("connected to %s", link)
+        self.connected = True
+        return 1
     
     def valid(self, text, reply):
         parts = text.split(" ")
@@ -270,16 +348,34 @@ class LG1800(object):
         
     def displayRows(self,text):
         self.displayRow(text[:20],1)
-        time.sleep(self.snooze)
+        self.pacer.wait('display')
         self.displayRow(text[20:40],2)
-        time.sleep(self.snooze)
+        self.pacer.wait('display')
         self.displayRow(text[40:60],3)
-        time.sleep(self.snooze)
+        self.pacer.wait('display')
         self.displayRow(text[60:80],4)
 
     
     def setConfiguration(self, par, value):
+        request = self.formatConfiguration(par, value)
+        if request is None:
+            return
+        # with elideConfiguration the value already set on the device is not sent again
+        if self.elideConfiguration and self.configuration.get(par) == request:
+            return
+        self.send(request)
+        if self.connected:
+            self.configuration[par] = request
+        else:
+            self.configuration = {}
+
+    def formatConfiguration(self, par, value, strict=False):
         '''
+        Validates a parameter and returns the request to be sent,
+        None for the parameters that must not be sent.
+        With strict=True the parameters without a validating function
+        raise ValueError instead of being sent as they are.
+
         NOTE: DON'T rely on the default values stated in the
         official SPS protocoll communication documents.
         
@@ -393,39 +489,37 @@ class LG1800(object):
             elif value > '100':
                 value = '100'
         else:
+            if strict:
+                raise ValueError("unknown configuration parameter %s" % par)
             logging.info("Missing validating function for input setting %s", par)
         # validate input  
         if par in nosend:
-            pass
-        else:    
-            request = "CONF:" + par + " " + value
-            self.send(request)
+            return None
+        return "CONF:" + par + " " + value
         
     
     def updateState(self):
-        time.sleep(self.snooze)
+        self.pacer.wait('query')
         rawSTA = int(self.send_receive("*STA?"))
         ''' unsigned short int 0-255
         Decodes the status register describing the current activity when the device performs a test.
         ‘Test end’ bits have meaning only if ‘Activity’ bits are set to ‘Test finished’ (1000).
-        high nibble: Activity
-        low nibble: Test end result
+        high nibble: Activity     (self.activityCode, self.activity as binary string)
+        low nibble: Test end result (self.testEndCode, self.testEnd as binary string)
         '''
-        descriptionTest = {
-        '0' : 'normal', '1' : 'stop button', '10' : 'HW test - high current', '11' : 'PW test - disconnected',
-        '100' : 'PW disconnected/U low', '101' : 'SK control released', '110' : 'LC test - high current',
-        '111' : 'extension failed', '1000' : 'HV test - low current', '1001' : 'PW test - U > U max',
-        '1010' : 'Over Arc max', '1011' : 'Temp err', '1100' : 'Hardware err', '1111' : 'after syst:HALT'
-        }
-        descriptionActivity = {
-        '0' : 'idle', '1' : 'test starting', '10' : 'test preparing', '11' : 'ramp up',
-        '110' : 'measuring', '101' : 'ramp down', '100' : 'test end', '1000' : 'test finished'
-        }
-        self.activity = str(bin((rawSTA >> 4) & 15))[2:]
-        self.testEnd = str(bin(rawSTA & 15))[2:]
-        self.desActivity = descriptionActivity[self.activity]
-        self.desTestEnd = descriptionTest[self.testEnd]
-        logging.info(self.desActivity)
+        # precomputed tables, see decoding.py
+        rawSTA &= 255
+        self.activityCode = decoding.STATUS_ACTIVITY[rawSTA]
+        self.testEndCode = decoding.STATUS_TESTEND[rawSTA]
+        self.activity = decoding.STATUS_ACTIVITY_BITS[rawSTA]
+        self.testEnd = decoding.STATUS_TESTEND_BITS[rawSTA]
+        self.desActivity = decoding.STATUS_ACTIVITY_DESCRIPTION[rawSTA]
+        self.desTestEnd = decoding.STATUS_TESTEND_DESCRIPTION[rawSTA]
+        # log and publish only the changes, this runs in the polling loop of waitTestEnd
+        if rawSTA != self.rawSTA:
+            self.rawSTA = rawSTA
+            logging.info(self.desActivity)
+            self.publishState()
 
     def waitTestEnd(self, funky = lambda dura: None, duration = 1):
         # during the execution of a particulr test (updateState polls the status register)
@@ -437,10 +531,21 @@ class LG1800(object):
         funky(duration)
         # the duration of the funky function should be less than the 
         # duration of the test.
-        while self.activity != '1000':
-            self.updateState()
-        # waiting for a little bit because sometimes the response from the device doesn't arrive, 
-        # we suppose that waiting could help in avoiding missing responses.
+        streamer = self.streamer
+        if streamer is not None:
+            streamer.begin(self.currentMeas)
+        try:
+            while self.activityCode != decoding.FINISHED:
+                self.updateState()
+                # live READ:* values between the status polls (see streaming.LiveStream)
+                if streamer is not None:
+                    streamer.poll(self)
+        finally:
+            # the followers of the stream must not wait forever
+            if streamer is not None:
+                streamer.end()
+        # the polls are paced by self.pacer because sometimes the response from the device
+        # doesn't arrive when requests are too close to each other.
 
     def inputLevel(self, digitalInput):
         '''
@@ -460,7 +565,11 @@ class LG1800(object):
         else:
             inpstr = "*INP "
         inputValue = int(self.send_receive(inpstr + str(digitalInput) + "?"))
-        self.inputs[digitalInput] = inputValue
+        if self.inputs[digitalInput] != inputValue:
+            # a new object, like the list it replaces: references kept by the callers don't change
+            inputs = decoding.InputBits(self.inputs.raw)
+            inputs[digitalInput] = inputValue
+            self.inputs = inputs
         return(inputValue)
 
     def inputLevels(self):
@@ -484,48 +593,53 @@ class LG1800(object):
         14 = HV pistols in 1800 devices (I5 and H5 tests)
         15 = Fuse state, 1 = OK 0 = broken
         '''
-        rawInputs = self.send_receive("*INPW?")
-        inputs = [int(i) for i in bin(int(rawInputs))[2:]]
-        missingZeros = 16 - len(inputs)
-        while missingZeros > 0:
-            missingZeros -= 1
-            inputs.insert(0,0)
-        inputs.reverse()
-        self.inputs = inputs
+        rawInputs = int(self.send_receive("*INPW?")) & 0xFFFF
+        # self.inputs is a decoding.InputBits: self.inputs[0] is input 01.
+        # It is replaced, never changed in place, so that prev = lg.inputs still
+        # holds the previous levels; polling without changes allocates nothing
+        if rawInputs != self.inputs.raw:
+            self.inputs = decoding.InputBits(rawInputs)
+            self.publishState()
 
     def oF(self, keyw):
         self.outputFunctional(keyw)
     
+    # fuses of the output register, used by outputFunctional. "REVERSE" "FORWARD" "OFF"
+    # fuses are hardcoded, for the time being
+    #  BIT  purpose forward reverse 230 115 0uf 10uf 20uf 30uf 40uf 50uf 60uf ext1 ext2 OFF  FT
+    #   0   230/115V    x      x    1    0   x    x    x    x    x    x    x    x    x    x   x
+    #   1   L1          1      0    x    x   x    x    x    x    x    x    x    x    x    1   0
+    #   2   L2          0      1    x    x   x    x    x    x    x    x    x    x    x    1   0
+    #   3   ext 1/2     x      x    x    x   x    x    x    x    x    x    x    1    0    x   x
+    #   4   10uF        x      x    x    x   0    1    0    0    1    0    1    x    x    x   x
+    #   5   20uF        x      x    x    x   0    0    1    0    0    1    1    x    x    x   x
+    #   6   30uF        x      x    x    x   0    0    0    1    1    1    1    x    x    x   x
+    #   7   free        x      x    x    x   x    x    x    x    x    x    x    x    x    x   x
+
+    FUSES = {
+    "230V" : "000;001",
+    "115V" : "001;000",
+    "FORWARD" : "004;002",
+    "REVERSE" : "002;004",
+    "OFF"  : "000;006", # default condition to be set before an after any kind of test: both L1 and L2 active
+    "FT"   : "006;000",
+    "0uf"  : "112;000",
+    "10uf" : "096;016",
+    "20uf" : "080;032",
+    "30uf" : "048;064",
+    "40uf" : "032;080",
+    "50uf" : "016;096",
+    "60uf" : "000;112",
+    "ext1" : "000;008",
+    "ext2" : "008;000"
+    }
+
+    def outputMasks(self, keyword):
+        # *SET <clear>;<set>: returns the (clear, set) bit masks of a keyword
+        clear, set_ = self.FUSES[keyword].split(';')
+        return (int(clear), int(set_))
+
     def outputFunctional(self, keyw):
-        # sets the fuses of the output. "REVERSE" "FORWARD" "OFF"
-        # fuses are hardcoded, for the time being
-        #  BIT  purpose forward reverse 230 115 0uf 10uf 20uf 30uf 40uf 50uf 60uf ext1 ext2 OFF  FT
-        #   0   230/115V    x      x    1    0   x    x    x    x    x    x    x    x    x    x   x
-        #   1   L1          1      0    x    x   x    x    x    x    x    x    x    x    x    1   0
-        #   2   L2          0      1    x    x   x    x    x    x    x    x    x    x    x    1   0
-        #   3   ext 1/2     x      x    x    x   x    x    x    x    x    x    x    1    0    x   x
-        #   4   10uF        x      x    x    x   0    1    0    0    1    0    1    x    x    x   x
-        #   5   20uF        x      x    x    x   0    0    1    0    0    1    1    x    x    x   x
-        #   6   30uF        x      x    x    x   0    0    0    1    1    1    1    x    x    x   x
-        #   7   free        x      x    x    x   x    x    x    x    x    x    x    x    x    x   x
-        
-        fuses = {
-        "230V" : "000;001",
-        "115V" : "001;000",
-        "FORWARD" : "004;002",
-        "REVERSE" : "002;004",
-        "OFF"  : "000;006", # default condition to be set before an after any kind of test: both L1 and L2 active
-        "FT"   : "006;000",
-        "0uf"  : "112;000",
-        "10uf" : "096;016",
-        "20uf" : "080;032",
-        "30uf" : "048;064",
-        "40uf" : "032;080",
-        "50uf" : "016;096",
-        "60uf" : "000;112",
-        "ext1" : "000;008",
-        "ext2" : "008;000"
-        }
         keyword = keyw
         # toggle between ext1 and ext2
         if keyword == "toggleEXT":
@@ -534,8 +648,21 @@ class LG1800(object):
             else:
                 keyword = "ext1"
             self.exta = keyword
-        self.send("*SET " + fuses[keyword])
-        time.sleep(self.snooze)
+        clear, set_ = self.outputMasks(keyword)
+        touched = clear | set_
+        # with elideOutputs the request is skipped when the contactors involved
+        # are already known to be in the requested position
+        if self.elideOutputs and (self.outputKnown & touched) == touched and (self.outputRegister & touched) == set_:
+            return
+        self.send("*SET " + self.FUSES[keyword])
+        if self.connected:
+            self.outputRegister = (self.outputRegister & ~clear) | set_
+            self.outputKnown |= touched
+        else:
+            self.outputKnown = 0
+        self.publishState()
+        # leave the contactors the time to settle
+        self.pacer.wait('switch')
         
         
     def initQuadro(self, exta, mains, capacitor):
@@ -573,25 +700,15 @@ class LG1800(object):
         current = float(self.send_receive("READ:CT:CURR?"))
         if not autotest:
             self.outputFunctional("OFF")
-        result = True
-        reason = ""
-        # se il test viene eseguito con valutazione dello scarto percentuale rispetto ad un valore di riferimento
-        if not absolute:
-            imin = nom*(100-inftolerance)/100
-            imax = nom*(100+suptolerance)/100
-        # se il test viene eseguito con criteri di accettazione, considerali
-        if current < imin:
-            result = False
-            reason = "Open circuit"
-        elif current > imax:
-            if checkimax:
-                result = False
-                reason = "Short circuit"
+        # limiti assoluti o relativi al valore nominale, vedi limits.evaluateCT
+        result, reason = limits.evaluateCT(current, absolute, checkimax, imin, imax, nom, suptolerance, inftolerance)
         # chiarire la relazione tra corrente e resistenza, ossia stabilire
         # il valore di tensione da usare per il calcolo, non è 22 V...
         # anche se con il multimetro ho visto un picco intorno ai 22V.
         # verifica resistenza...
-        return({'current': current,'reason': reason,'result': result})
+        record = CTResult(current, reason, result)
+        return(self.notifyResult(record, {'absolute': absolute, 'checkimax': checkimax, 'imin': imin, 'imax': imax, 'nom': nom,
+        'suptolerance': suptolerance, 'inftolerance': inftolerance}))
 
 # ########################### #
 #  Protective Wire Test (PW)  #
@@ -609,18 +726,12 @@ class LG1800(object):
         # returns a dict with the measured results.
         self.send("MEAS:PW")
         self.waitTestEnd()
-        result =True
-        reason = ""
         current = float(self.send_receive("READ:PW:CURR?"))
         voltageDrop = float(self.send_receive("READ:PW:VOLT?"))
         resistance = float(self.send_receive("READ:PW:RES?"))
-        if resistance < rmin:
-            result = False
-            reason = "Resistance lower than Rmin"
-        elif resistance > rmax:
-            result = False
-            reason = "Resistance greater than Rmax"
-        return({'current': current,'voltageDrop': voltageDrop,'resistance': resistance,'reason': reason,'result': result})
+        result, reason = limits.evaluatePW(resistance, rmin, rmax)
+        record = PWResult(current, voltageDrop, resistance, reason, result)
+        return(self.notifyResult(record, {'rmin': rmin, 'rmax': rmax}))
         
 # ###################### #
 #  Insulation Test (IS)  #
@@ -634,8 +745,6 @@ class LG1800(object):
         # for class II appliances the connection is between L+N and the chassis.
         self.send("MEAS:I5")
         self.waitTestEnd()
-        result = True
-        reason = ""
         voltage = float(self.send_receive("READ:I5:VOLT?"))
         voltMax = float(self.send_receive("READ:I5:VOLTMAX?"))
         voltMin = float(self.send_receive("READ:I5:VOLTMIN?"))
@@ -645,23 +754,20 @@ class LG1800(object):
         resistance = float(self.send_receive("READ:I5:RES?"))
         resistanceMax = float(self.send_receive("READ:I5:RESMAX?"))
         resistanceMin = float(self.send_receive("READ:I5:RESMIN?"))
-        if resistance < rmin:
-            result = False
-            reason = "Resistance lower than Rmin"
-        
-        return({'voltage': voltage,
-        'voltMax': voltMax,
-        'voltMin': voltMin,
-        'current': current,
-        'currentMax': currentMax,
-        'currentMin': currentMin,
-        'resistance': resistance,
-        'resistanceMax': resistanceMax,
-        'resistanceMin': resistanceMin,
-        'reason': reason,
-        'result': result
-        }
+        result, reason = limits.evaluateIS(resistance, rmin)
+        record = ISResult(voltage=voltage,
+        voltMax=voltMax,
+        voltMin=voltMin,
+        current=current,
+        currentMax=currentMax,
+        currentMin=currentMin,
+        resistance=resistance,
+        resistanceMax=resistanceMax,
+        resistanceMin=resistanceMin,
+        reason=reason,
+        result=result
         )
+        return(self.notifyResult(record, {'rmin': rmin}))
         
 # ############################### #
 #   High Voltage Test H5 (AC/DC)  #
@@ -674,8 +780,6 @@ class LG1800(object):
         # DUT, an arc-over will occur.
         self.send("MEAS:H5")
         self.waitTestEnd()
-        result = True
-        reason = ""
         voltage = float(self.send_receive("READ:H5:VOLT?"))
         voltMax = float(self.send_receive("READ:H5:VOLTMAX?"))
         voltMin = float(self.send_receive("READ:H5:VOLTMIN?"))
@@ -685,34 +789,26 @@ class LG1800(object):
         arc = float(self.send_receive("READ:H5:ARC?"))
         arcMax = float(self.send_receive("READ:H5:ARCMAX?"))
         arcMin = float(self.send_receive("READ:H5:ARCMIN?"))
-        if current < imin:
-            result = False
-            reason = "Current lower than Imin"
-        elif current > imax:
-            result = False
-            reason = "Current greater than Imax"
-        
-        return({'voltage': voltage,
-        'voltMax': voltMax,
-        'voltMin': voltMin,
-        'current': current,
-        'currentMax': currentMax,
-        'currentMin': currentMin,
-        'arc': arc,
-        'arcMax': arcMax,
-        'arcMin': arcMin,
-        'reason': reason,
-        'result': result
-        }
+        result, reason = limits.evaluateHV(current, imin, imax)
+        record = HVResult(voltage=voltage,
+        voltMax=voltMax,
+        voltMin=voltMin,
+        current=current,
+        currentMax=currentMax,
+        currentMin=currentMin,
+        arc=arc,
+        arcMax=arcMax,
+        arcMin=arcMin,
+        reason=reason,
+        result=result
         )
+        return(self.notifyResult(record, {'imin': imin, 'imax': imax}))
 
 # ##################### #
 #   Function Test (F1)  #
 # ##################### #
 
     def runFT(self, imin=0, imax=10, pausa=0.1, duration=1, autotest=False):
-        result = True
-        reason = ""
         logging.info('autotest ' + str(autotest))
         if autotest:
             currentFwd = 0.0
@@ -739,37 +835,24 @@ class LG1800(object):
         currentMinRev = float(self.send_receive("READ:F1:CURRMIN?"))
         # TODO: non c'è molta documentazione, quindi in base alle prime misurazioni
         # considerare se utilizare current o currentMax/currentMin
-        if not autotest:
-            minCurrentMeasured = min(currentFwd,currentRev)
-            maxCurrentMeasured = max(currentFwd,currentRev)
-        else:
-            minCurrentMeasured = currentRev
-            maxCurrentMeasured = currentRev
-        if minCurrentMeasured < imin:
-            result = False
-            reason = "current lower than Imin"
-        elif maxCurrentMeasured > imax:
-            result = False
-            reason = "current greater than Imax"
-        else:
-            result = True
-        
+        result, reason = limits.evaluateFT(currentFwd, currentRev, imin, imax, autotest)
         vtr = self.vibesTestResult
         self.vibesTestResult = self.defaultvibesTestResult
         if vtr["result"] == False:
             result = False
             reason = vtr["reason"]
-        return({'currentFwd': currentFwd,
-        'currentMaxFwd': currentMaxFwd,
-        'currentMinFwd': currentMinFwd,
-        'currentRev': currentRev,
-        'currentMaxRev': currentMaxRev,
-        'currentMinRev': currentMinRev,
-        'reason': reason,
-        'result': result,
-        'vtr':vtr
-        }
+        record = FTResult(currentFwd=currentFwd,
+        currentMaxFwd=currentMaxFwd,
+        currentMinFwd=currentMinFwd,
+        currentRev=currentRev,
+        currentMaxRev=currentMaxRev,
+        currentMinRev=currentMinRev,
+        reason=reason,
+        result=result,
+        vtr=vtr,
+        autotest=autotest
         )
+        return(self.notifyResult(record, {'imin': imin, 'imax': imax, 'autotest': autotest}))
 
 # ########################### #
 #  Leakage Current Test (L1)  #
@@ -778,24 +861,40 @@ class LG1800(object):
     def runLC(self):
         self.send("MEAS:L1")
         self.waitTestEnd()
-        result = True
-        reason = ""
         voltage = float(self.send_receive("READ:L1:VOLT?"))
         voltMax = float(self.send_receive("READ:L1:VOLTMAX?"))
         voltMin = float(self.send_receive("READ:L1:VOLTMIN?"))
         current = float(self.send_receive("READ:L1:CURR?"))
         currentMax = float(self.send_receive("READ:L1:CURRMAX?"))
         currentMin = float(self.send_receive("READ:L1:CURRMIN?"))
-        return({'voltage': voltage,
-        'voltMax': voltMax,
-        'voltMin': voltMin,
-        'current': current,
-        'currentMax': currentMax,
-        'currentMin': currentMin,
-        'reason': reason,
-        'result': result
-        }
+        result, reason = limits.evaluateLC()
+        record = LCResult(voltage=voltage,
+        voltMax=voltMax,
+        voltMin=voltMin,
+        current=current,
+        currentMax=currentMax,
+        currentMin=currentMin,
+        reason=reason,
+        result=result
         )
+        return(self.notifyResult(record, {}))
+
+    def notifyResult(self, record, testLimits):
+        # keeps the last result of each test and hands it, with the limits
+        # used to judge it, to the registered listeners (spc.SPCMonitor, ...)
+        self.lastResults[record.test] = record
+        self.publishState(record)
+        for listener in self.resultListeners:
+            try:
+                listener(record, testLimits)
+            except:
+                logging.error("Errore nella gestione del risultato %s", record.test, exc_info=True)
+        return record
+
+    def publishState(self, record=None):
+        # optional publication for the local HMI processes (see sharedstate.StatePublisher)
+        if self.statePublisher is not None:
+            self.statePublisher.publish(self, record)
 
 # ############################### #
 #  Vibration (noise) Test (Vibes) #
@@ -815,21 +914,28 @@ class LG1800(object):
 #        System Init         #
 # ########################## #
 
-    def initConn(self, port):
+    def initConn(self, port, deadline=None):
+        # deadline: time.monotonic() after which we stop retrying
         while True:
             self.connect(port)
             if not self.connected:
+                if deadline is not None and time.monotonic() + 5 > deadline:
+                    logging.warning("LG1800 non connesso, tempo scaduto.")
+                    break
                 logging.info("Riprovo tra 5 secondi.")
                 time.sleep(5)
             else:
                 logging.info("LG1800 connesso")
+                self.counters['connections'] += 1
+                if self.adaptivePacing:
+                    self.pacer.calibrate(self)
                 break
 
-    def testConnection(self):
+    def testConnection(self, deadline=None):
         # the connection may be lost, here we check if this is the case.
         self.send_receive("*IDN?")
         if not self.connected:
-            self.initConn(self.s.port)
+            self.initConn(self.port, deadline)
 
     def initData(self):
         
@@ -841,6 +947,9 @@ class LG1800(object):
         self.testEnd = None
         self.desActivity = None
         self.desTestEnd = None
+        self.activityCode = None
+        self.testEndCode = None
+        self.rawSTA = None
         self.defaultvibesTestResult = {'reason': "",
         'result': True
         }
@@ -852,11 +961,45 @@ class LG1800(object):
         self.outputFunctional(self.mains)
         self.inputLevels()
         # audio
-        self.vib = vibes.VibesAnalyzer()
+        if self.audio:
+            self.vib = vibes.VibesAnalyzer()
+        else:
+            self.vib = None
 
-    def __init__(self, port, debug=False):
+    def __init__(self, port, debug=False, adaptivePacing=True, audio=True):
         self.connected = False
+        # gap between commands; with adaptivePacing the query gap is calibrated
+        # and the gaps widen when the device doesn't keep up (see pacing.LinkPacer)
         self.snooze = 0.1
+        self.adaptivePacing = adaptivePacing
+        self.audio = audio
+        # link statistics, see also self.pacer.stats()
+        self.counters = {'connections': 0, 'resyncs': 0, 'errors': 0}
+        # the last errors read from the queue, and how many of each code since the start
+        self.errorLog = deque(maxlen=100)
+        self.errorCodes = Counter()
+        self.pacer = pacing.LinkPacer(gap=self.snooze, adaptive=adaptivePacing)
+        # state of the output register and of the configuration as written by us
+        # (see outputFunctional and setConfiguration)
+        self.outputRegister = 0
+        self.outputKnown = 0
+        self.configuration = {}
+        self.elideOutputs = False
+        self.elideConfiguration = False
+        # callables invoked as listener(record, limits) after every test
+        self.resultListeners = []
+        self.lastResults = {}
+        # optional streaming.LiveStream
+        self.streamer = None
+        self.currentMeas = None
+        # optional sharedstate.StatePublisher
+        self.statePublisher = None
+        self.inputs = decoding.InputBits()
+        # link to the device, see transport.py
+        self.s = None
+        self.port = None
+        self.encoder = transport.FrameEncoder()
+        self.rawSTA = None
         self.mains = "230V"
         self.exta = "ext1"
         self.initConn(port)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    sharedstate.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import atexit
+import logging
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+''' Fixed layout of the shared block (little endian):
+offset  0  sequence counter, odd while the writer is updating the block
+offset  8  pid of the writer
+offset 16  state: time, connected, activity, test end, inputs (bit 0 = input 1),
+           output register, known output bits, temperature, serial number
+then one slot per test in TESTS: time, result (-1 = none), main value, reason
+'''
+SEQ = struct.Struct('<Q')
+WRITER = struct.Struct('<Q')
+STATE = struct.Struct('<dBBBxHHHh16s')
+RESULT = struct.Struct('<dbxxxxxxxd48s')
+TESTS = ('CT', 'PW', 'IS', 'HV', 'FT', 'LC')
+# main measured value published for each test
+MAIN_VALUE = {'CT': 'current', 'PW': 'resistance', 'IS': 'resistance', 'HV': 'current', 'FT': 'currentRev', 'LC': 'current'}
+WRITER_OFFSET = SEQ.size
+STATE_OFFSET = WRITER_OFFSET + WRITER.size
+RESULT_OFFSET = STATE_OFFSET + STATE.size
+SIZE = RESULT_OFFSET + RESULT.size * len(TESTS)
+UNKNOWN = 255
+NO_TEMPERATURE = -32768
+# blocks created by the publishers of this process, see StateReader
+CREATED = set()
+
+def writerAlive(pid):
+    # signal 0: only checks that the process exists
+    if pid <= 0 or os.name == 'nt':
+        # on Windows os.kill would terminate it, and a block there lives only
+        # as long as some process has it open: assume the writer is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # it exists, owned by another user
+        return True
+    return True
+
+def nibble(value):
+    if value is None:
+        return UNKNOWN
+    return value
+
+
+class StatePublisher(object):
+    """ Publishes the state of an LG1800 in a shared memory block.
+    Enable it with lg.statePublisher = StatePublisher('lg1800-bench1'),
+    the readers (StateReader) never touch the serial link.
+    Single writer: the process owning the LG1800.
+    The block is unlinked by close(), at exit, and by the resource tracker
+    if the process dies; a block left over with the same name (e.g. after a
+    kill -9) is replaced only if the process that wrote it is gone,
+    otherwise FileExistsError is raised.
+    """
+
+    def __init__(self, name=None):
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=SIZE)
+        except FileExistsError:
+            self.replace(name)
+        self.name = self.shm.name
+        CREATED.add(self.name)
+        atexit.register(self.close)
+        self.buf = self.shm.buf
+        self.seq = 0
+        self.buf[:SIZE] = bytes(SIZE)
+        WRITER.pack_into(self.buf, WRITER_OFFSET, os.getpid())
+        for i in range(len(TESTS)):
+            RESULT.pack_into(self.buf, RESULT_OFFSET + i * RESULT.size, 0.0, -1, 0.0, b'')
+
+    def replace(self, name):
+        stale = shared_memory.SharedMemory(name=name)
+        try:
+            if stale.size < STATE_OFFSET:
+                pid = 0
+            else:
+                pid = WRITER.unpack_from(stale.buf, WRITER_OFFSET)[0]
+            if writerAlive(pid):
+                raise FileExistsError("shared state %s is in use (writer pid %d)" % (name, pid))
+        finally:
+            stale.close()
+        logging.warning("shared state %s left over by process %d, replacing it", name, pid)
+        stale.unlink()
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SIZE)
+
+    def begin(self):
+        self.seq += 1
+        SEQ.pack_into(self.buf, 0, self.seq)
+
+    def commit(self):
+        self.seq += 1
+        SEQ.pack_into(self.buf, 0, self.seq)
+
+    def publish(self, lg, record=None):
+        self.begin()
+        try:
+            temperature = getattr(lg, 'temperature', None)
+            STATE.pack_into(self.buf, STATE_OFFSET, time.time(), int(bool(lg.connected)),
+                nibble(lg.activityCode), nibble(getattr(lg, 'testEndCode', None)),
+                lg.inputs.raw, lg.outputRegister, lg.outputKnown,
+                NO_TEMPERATURE if temperature is None else temperature,
+                (getattr(lg, 'lgsn', None) or '').encode('latin_1')[:16])
+            if record is not None:
+                i = TESTS.index(record.test)
+                RESULT.pack_into(self.buf, RESULT_OFFSET + i * RESULT.size, time.time(), int(bool(record['result'])),
+                    float(record[MAIN_VALUE[record.test]]), record['reason'].encode('UTF-8')[:48])
+        finally:
+            self.commit()
+
+    def close(self, unlink=True):
+        if self.shm is None:
+            return
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            CREATED.discard(self.name)
+        self.shm = None
+
+
+class StateReader(object):
+    """ Reads consistent snapshots of a block written by StatePublisher. """
+
+    def __init__(self, name):
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before python 3.13 the resource tracker would unlink the block when the reader exits;
+            # a publisher of this same process shares the registration, leave it alone
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.name not in CREATED:
+                try:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(self.shm._name, 'shared_memory')
+                except Exception:
+                    pass
+        self.buf = self.shm.buf
+
+    def sequence(self):
+        return SEQ.unpack_from(self.buf, 0)[0]
+
+    def snapshot(self, retries=1000):
+        ''' Returns the state as a dict, None if the writer kept the block busy
+        for all the retries.
+        '''
+        for attempt in range(retries):
+            before = SEQ.unpack_from(self.buf, 0)[0]
+            if before & 1:
+                continue
+            state = STATE.unpack_from(self.buf, STATE_OFFSET)
+            results = [RESULT.unpack_from(self.buf, RESULT_OFFSET + i * RESULT.size) for i in range(len(TESTS))]
+            if SEQ.unpack_from(self.buf, 0)[0] == before:
+                return self.decode(before, state, results)
+        return None
+
+    def writer(self):
+        # pid of the publisher
+        return WRITER.unpack_from(self.buf, WRITER_OFFSET)[0]
+
+    def decode(self, seq, state, results):
+        t, connected, activity, testEnd, inputs, register, known, temperature, lgsn = state
+        snapshot = {'sequence': seq,
+        'time': t,
+        'connected': bool(connected),
+        'activity': None if activity == UNKNOWN else activity,
+        'testEnd': None if testEnd == UNKNOWN else testEnd,
+        'inputs': [(inputs >> i) & 1 for i in range(16)],
+        'outputRegister': register,
+        'outputKnown': known,
+        'temperature': None if temperature == NO_TEMPERATURE else temperature,
+        'lgsn': lgsn.rstrip(b'\x00').decode('latin_1'),
+        'results': {}
+        }
+        for test, (rt, result, value, reason) in zip(TESTS, results):
+            if result >= 0:
+                snapshot['results'][test] = {'time': rt, 'result': bool(result), 'value': value,
+                'reason': reason.rstrip(b'\x00').decode('UTF-8', 'replace')}
+        return snapshot
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    sink.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import atexit
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+COLUMNS = ('time', 'station', 'firmware', 'temperature', 'product', 'test', 'result', 'reason', 'data')
+
+class ResultSink(object):
+    """ Stores the test results from a background thread, so that the test
+    thread never waits for the disk.
+    put() only appends to an in-memory queue, the writer drains it in batches
+    of up to batchSize rows (or whatever arrived within flushInterval seconds).
+    Subclasses implement openWriter(), write(rows) and closeWriter(), all called
+    from the writer thread.
+    maxQueue: 0 for an unbounded queue, otherwise the rows exceeding it are dropped.
+    """
+
+    def __init__(self, batchSize=500, flushInterval=0.5, maxQueue=0):
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.queue = queue.Queue(maxQueue)
+        self.lg = None
+        self.product = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name=type(self).__name__)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close)
+
+    def attach(self, lg, product=None):
+        # device identity comes from LG1800.initData, every result of lg is stored
+        self.lg = lg
+        self.product = product
+        lg.resultListeners.append(self.onResult)
+
+    def identity(self):
+        lg = self.lg
+        if lg is None:
+            return (None, None, None)
+        firmware = getattr(lg, 'idn', {}).get('firmware')
+        if isinstance(firmware, bytes):
+            firmware = firmware.decode('latin_1')
+        return (getattr(lg, 'lgsn', None), firmware, getattr(lg, 'temperature', None))
+
+    def onResult(self, record, testLimits=None):
+        self.put(record.test, record)
+
+    def put(self, test, result, product=None):
+        station, firmware, temperature = self.identity()
+        # dict(result): a copy, the caller may still change the record after put()
+        row = (time.time(), station, firmware, temperature, product or self.product, test,
+            int(bool(result['result'])), result['reason'], dict(result))
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logging.warning("result sink full, %d results dropped", self.dropped)
+
+    def run(self):
+        try:
+            self.openWriter()
+        except:
+            logging.error("Errore nell'apertura dell'archivio dei risultati", exc_info=True)
+            self.errors += 1
+            return
+        stop = False
+        while not stop:
+            rows = []
+            try:
+                row = self.queue.get(timeout=self.flushInterval)
+            except queue.Empty:
+                continue
+            while row is not None:
+                rows.append(row)
+                if len(rows) >= self.batchSize:
+                    break
+                try:
+                    row = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if row is None:
+                # close() was called
+                stop = True
+            if rows:
+                try:
+                    self.write(rows)
+                    self.written += len(rows)
+                except:
+                    self.errors += 1
+                    logging.error("Errore nella scrittura di %d risultati", len(rows), exc_info=True)
+        self.closeWriter()
+
+    def close(self, timeout=10):
+        # flushes what is queued and stops the writer
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'written': self.written, 'dropped': self.dropped, 'errors': self.errors}
+
+    def openWriter(self):
+        pass
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def closeWriter(self):
+        pass
+
+
+class SQLiteSink(ResultSink):
+    """ Results in a SQLite table, WAL mode, one transaction per batch. """
+
+    def __init__(self, path, table='results', **kwargs):
+        self.path = path
+        self.table = table
+        ResultSink.__init__(self, **kwargs)
+
+    def openWriter(self):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS " + self.table + " (id INTEGER PRIMARY KEY, time REAL, "
+            "station TEXT, firmware TEXT, temperature INTEGER, product TEXT, test TEXT, "
+            "result INTEGER, reason TEXT, data TEXT)")
+        self.db.commit()
+
+    def write(self, rows):
+        with self.db:
+            self.db.executemany("INSERT INTO " + self.table + " (time, station, firmware, temperature, product, "
+                "test, result, reason, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row[:-1] + (json.dumps(row[-1], default=str),) for row in rows])
+
+    def closeWriter(self):
+        self.db.close()
+
+
+class RotatingFileSink(ResultSink):
+    """ Append-only file, renamed to path.1, path.2, ... when it grows over maxBytes. """
+
+    def __init__(self, path, maxBytes=64 * 1024 * 1024, backupCount=10, **kwargs):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.f = None
+        ResultSink.__init__(self, **kwargs)
+
+    def openWriter(self):
+        self.f = open(self.path, 'a', newline='')
+
+    def rotate(self):
+        self.f.close()
+        for i in range(self.backupCount - 1, 0, -1):
+            old = "%s.%d" % (self.path, i)
+            if os.path.exists(old):
+                os.replace(old, "%s.%d" % (self.path, i + 1))
+        if self.backupCount > 0:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self.openWriter()
+
+    def write(self, rows):
+        self.f.write(self.encode(rows))
+        self.f.flush()
+        if self.maxBytes and self.f.tell() >= self.maxBytes:
+            self.rotate()
+
+    def closeWriter(self):
+        if self.f is not None:
+            self.f.close()
+
+
+class JSONLSink(RotatingFileSink):
+    """ One JSON object per line. """
+
+    def encode(self, rows):
+        return ''.join(json.dumps(dict(zip(COLUMNS, row)), default=str) + '\n' for row in rows)
+
+
+class CSVSink(RotatingFileSink):
+    """ CSV with the COLUMNS header, the measured values are in the 'data' column as JSON. """
+
+    def openWriter(self):
+        RotatingFileSink.openWriter(self)
+        if self.f.tell() == 0:
+            csv.writer(self.f).writerow(COLUMNS)
+
+    def encode(self, rows):
+        out = []
+        for row in rows:
+            out.append(row[:-1] + (json.dumps(row[-1], default=str),))
+        buf = io.StringIO()
+        csv.writer(buf).writerows(out)
+        return buf.getvalue()
+
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    slots.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import logging
+import time
+from . import decoding
+
+# slot states
+EMPTY = 0
+LOADED = 1
+READY = 2
+TESTING = 3
+DONE = 4
+STATE_NAMES = ('empty', 'loaded', 'ready', 'testing', 'done')
+
+class Slot(object):
+    """ One of the two DUT positions of the bench (ext1/ext2). """
+
+    def __init__(self, name, readyInput, loadedInput=None):
+        # readyInput/loadedInput: index in LG1800.inputs (input number - 1)
+        self.name = name
+        self.readyInput = readyInput
+        self.loadedInput = loadedInput
+        self.state = EMPTY
+        self.readySince = None
+        self.tests = 0
+        self.busyTime = 0.0
+        self.waitTime = 0.0
+        self.lastResult = None
+
+    def update(self, inputs):
+        ready = inputs[self.readyInput] == 1
+        if self.state == DONE:
+            # the operator has to release the "pronto" input (unloading the DUT)
+            # before the slot can be tested again
+            if not ready:
+                self.state = EMPTY
+        elif self.state in (EMPTY, LOADED):
+            if ready:
+                self.state = READY
+                self.readySince = time.monotonic()
+            elif self.loadedInput is not None and inputs[self.loadedInput] == 1:
+                self.state = LOADED
+            else:
+                self.state = EMPTY
+        elif self.state == READY and not ready:
+            # the operator withdrew the DUT before the test started
+            self.state = EMPTY
+            self.readySince = None
+
+
+class SlotScheduler(object):
+    """ Runs the test sequence on whichever of the two DUT positions is ready,
+    so that the operator can load one appliance while the other is under test.
+    Inputs used by default (see LG1800.inputLevels):
+    02 1-Pronto -> ext1
+    07 2-Pronto -> ext2
+    sequence is a callable taking the LG1800 instance and returning the results,
+    or a dict {slot name: callable} when the two positions host different products.
+    """
+
+    def __init__(self, lg, sequence, readyInputs=None, loadedInputs=None, onResult=None):
+        if readyInputs is None:
+            readyInputs = {'ext1': 1, 'ext2': 6}
+        if loadedInputs is None:
+            loadedInputs = {}
+        self.lg = lg
+        self.sequence = sequence
+        self.onResult = onResult
+        self.slots = [Slot(name, readyInputs[name], loadedInputs.get(name)) for name in ('ext1', 'ext2')]
+        self.started = time.monotonic()
+        self.lastEnd = self.started
+        self.idleTime = 0.0
+
+    def slot(self, name):
+        for s in self.slots:
+            if s.name == name:
+                return s
+        raise KeyError(name)
+
+    def poll(self):
+        self.lg.inputLevels()
+        for s in self.slots:
+            s.update(self.lg.inputs)
+
+    def safeToSwitch(self):
+        # never move the contactor while the device is running a test
+        return self.lg.connected and self.lg.activityCode in (None, decoding.IDLE, decoding.FINISHED)
+
+    def select(self, s):
+        if self.lg.exta == s.name:
+            return True
+        if not self.safeToSwitch():
+            logging.warning("slot %s ready but the device is busy (%s)", s.name, self.lg.desActivity)
+            return False
+        # disconnect L1/L2 before moving the load to the other position
+        self.lg.outputFunctional("OFF")
+        self.lg.outputFunctional(s.name)
+        self.lg.exta = s.name
+        return True
+
+    def step(self):
+        ''' Polls the inputs and tests the slot that has been ready the longest.
+        Returns (slot name, results) or None when there was nothing to do.
+        '''
+        self.poll()
+        ready = [s for s in self.slots if s.state == READY]
+        if not ready:
+            return None
+        s = min(ready, key=lambda x: x.readySince)
+        if not self.select(s):
+            return None
+        t0 = time.monotonic()
+        self.idleTime += t0 - self.lastEnd
+        s.waitTime += t0 - s.readySince
+        s.state = TESTING
+        sequence = self.sequence
+        if isinstance(sequence, dict):
+            sequence = sequence[s.name]
+        try:
+            results = sequence(self.lg)
+        finally:
+            self.lastEnd = time.monotonic()
+            s.busyTime += self.lastEnd - t0
+            s.state = DONE
+            s.readySince = None
+        s.tests += 1
+        s.lastResult = results
+        logging.info("slot %s: test %d done in %.2f s", s.name, s.tests, self.lastEnd - t0)
+        if self.onResult is not None:
+            self.onResult(s.name, results)
+        return (s.name, results)
+
+    def run(self, cycles=None, pollInterval=0.05, stop=lambda: False):
+        # cycles: number of DUTs to test before returning, None runs until stop() is True
+        done = 0
+        while not stop() and (cycles is None or done < cycles):
+            if not self.lg.connected:
+                self.lg.testConnection()
+            if self.step() is None:
+                time.sleep(pollInterval)
+            else:
+                done += 1
+        return self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        idle = self.idleTime + (time.monotonic() - self.lastEnd)
+        report = {'elapsed': elapsed,
+        'instrumentIdle': idle,
+        'utilization': (1 - idle / elapsed) if elapsed > 0 else 0.0,
+        'slots': {}
+        }
+        for s in self.slots:
+            report['slots'][s.name] = {'state': STATE_NAMES[s.state],
+            'tests': s.tests,
+            'perHour': s.tests * 3600.0 / elapsed if elapsed > 0 else 0.0,
+            'busyTime': s.busyTime,
+            'waitTime': s.waitTime,
+            'idleTime': elapsed - s.busyTime
+            }
+        return report
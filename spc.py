@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    spc.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import logging
+import math
+from collections import deque
+from . import limits
+
+class RunningStats(object):
+    """ Count, mean, variance (Welford), min and max of a stream of values in O(1) memory. """
+    __slots__ = ('n', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def merge(self, other):
+        # Chan et al. parallel combination, the result is the same as feeding both streams
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.m2, self.min, self.max = other.n, other.mean, other.m2, other.min, other.max
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def stddev(self):
+        return math.sqrt(self.variance())
+
+    def cp(self, lsl, usl):
+        sigma = self.stddev()
+        if lsl is None or usl is None or sigma == 0:
+            return None
+        return (usl - lsl) / (6 * sigma)
+
+    def cpk(self, lsl, usl):
+        # one sided when only one of the limits is given
+        sigma = self.stddev()
+        if sigma == 0 or (lsl is None and usl is None):
+            return None
+        k = []
+        if lsl is not None:
+            k.append((self.mean - lsl) / (3 * sigma))
+        if usl is not None:
+            k.append((usl - self.mean) / (3 * sigma))
+        return min(k)
+
+
+class DriftDetector(object):
+    """ EWMA control chart. The centre line and sigma come from the first
+    'baseline' values, then an alarm is raised when the EWMA leaves
+    centre +- width * sigma * sqrt(lambda / (2 - lambda)).
+    """
+    __slots__ = ('weight', 'width', 'baseline', 'reference', 'ewma', 'alarm')
+
+    def __init__(self, weight=0.2, width=3.0, baseline=30):
+        self.weight = weight
+        self.width = width
+        self.baseline = baseline
+        self.reference = RunningStats()
+        self.ewma = None
+        self.alarm = False
+
+    def update(self, x):
+        if self.reference.n < self.baseline:
+            self.reference.update(x)
+            self.ewma = self.reference.mean
+            return False
+        self.ewma = self.weight * x + (1 - self.weight) * self.ewma
+        limit = self.width * self.reference.stddev() * math.sqrt(self.weight / (2 - self.weight))
+        self.alarm = abs(self.ewma - self.reference.mean) > limit
+        return self.alarm
+
+    def rebase(self):
+        # e.g. after the maintenance of the probe
+        self.reference = RunningStats()
+        self.ewma = None
+        self.alarm = False
+
+
+class WindowHistogram(object):
+    """ Fixed bins histogram of the last 'window' values. """
+
+    def __init__(self, low, high, bins=20, window=500):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.width = (high - low) / float(bins)
+        # two extra bins for the values out of range
+        self.counts = [0] * (bins + 2)
+        self.window = deque(maxlen=window)
+
+    def binOf(self, x):
+        if x < self.low:
+            return 0
+        if x >= self.high:
+            return self.bins + 1
+        return int((x - self.low) / self.width) + 1
+
+    def update(self, x):
+        if len(self.window) == self.window.maxlen:
+            self.counts[self.window[0]] -= 1
+        b = self.binOf(x)
+        self.window.append(b)
+        self.counts[b] += 1
+
+
+class FieldMonitor(object):
+    """ Statistics of one measured field of one test. """
+
+    def __init__(self, histogram=None, baseline=30):
+        self.stats = RunningStats()
+        self.drift = DriftDetector(baseline=baseline)
+        self.histogram = histogram
+        self.failed = 0
+        self.lsl = None
+        self.usl = None
+
+    def update(self, x, passed, lsl, usl):
+        self.stats.update(x)
+        if not passed:
+            self.failed += 1
+        self.lsl = lsl
+        self.usl = usl
+        if self.histogram is not None:
+            self.histogram.update(x)
+        return self.drift.update(x)
+
+    def summary(self):
+        s = self.stats
+        return {'n': s.n, 'failed': self.failed, 'mean': s.mean, 'stddev': s.stddev(),
+        'min': s.min, 'max': s.max, 'cp': s.cp(self.lsl, self.usl), 'cpk': s.cpk(self.lsl, self.usl),
+        'ewma': self.drift.ewma, 'drift': self.drift.alarm}
+
+
+def ctSpec(l):
+    imin, imax = limits.ctLimits(l.get('absolute', False), l.get('imin', 0), l.get('imax', 0.6), l.get('nom', 0.3),
+        l.get('suptolerance', 20), l.get('inftolerance', 20))
+    return (imin, imax if l.get('checkimax', False) else None)
+
+# test -> [(field, function(limits) -> (lsl, usl))]
+SPECS = {
+'CT' : [('current', ctSpec)],
+'PW' : [('resistance', lambda l: (l.get('rmin'), l.get('rmax')))],
+'IS' : [('resistance', lambda l: (l.get('rmin'), None))],
+'HV' : [('current', lambda l: (l.get('imin'), l.get('imax')))],
+'FT' : [('currentFwd', lambda l: (l.get('imin'), l.get('imax'))),
+        ('currentRev', lambda l: (l.get('imin'), l.get('imax')))],
+'LC' : [('current', lambda l: (None, None))]
+}
+
+class SPCMonitor(object):
+    """ Rolling statistics per product, station, test and field, fed by the
+    results of the LG1800.run* methods (see attach()).
+    histograms: optional {(test, field): (low, high, bins, window)}
+    onAlarm: called as onAlarm(key, summary) when the EWMA of a field drifts
+    """
+
+    def __init__(self, product=None, station=None, histograms=None, onAlarm=None, baseline=30):
+        self.product = product
+        self.station = station
+        self.histograms = histograms or {}
+        self.onAlarm = onAlarm
+        self.baseline = baseline
+        self.monitors = {}
+
+    def attach(self, lg):
+        if self.station is None:
+            self.station = getattr(lg, 'lgsn', None)
+        lg.resultListeners.append(self.update)
+
+    def monitor(self, key):
+        m = self.monitors.get(key)
+        if m is None:
+            histogram = None
+            h = self.histograms.get(key[2:])
+            if h is not None:
+                histogram = WindowHistogram(*h)
+            m = self.monitors[key] = FieldMonitor(histogram, self.baseline)
+        return m
+
+    def update(self, record, testLimits=None, product=None):
+        if product is None:
+            product = self.product
+        testLimits = testLimits or {}
+        alarms = []
+        for field, spec in SPECS[record.test]:
+            # no forward phase in autotest
+            if field == 'currentFwd' and testLimits.get('autotest'):
+                continue
+            lsl, usl = spec(testLimits)
+            key = (product, self.station, record.test, field)
+            m = self.monitor(key)
+            wasDrifting = m.drift.alarm
+            if m.update(record[field], record['result'], lsl, usl) and not wasDrifting:
+                alarms.append(key)
+                logging.warning("SPC: drift on %s", key)
+                if self.onAlarm is not None:
+                    self.onAlarm(key, m.summary())
+        return alarms
+
+    def summary(self):
+        return dict((key, m.summary()) for key, m in self.monitors.items())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    streaming.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import logging
+import struct
+import threading
+import time
+from collections import deque
+import numpy as np
+from . import decoding
+
+# live values read during each kind of measurement (MEAS:<key>)
+CHANNELS = {
+'CT' : ('READ:CT:CURR?',),
+'PW' : ('READ:PW:CURR?', 'READ:PW:VOLT?'),
+'I5' : ('READ:I5:VOLT?', 'READ:I5:CURR?'),
+'H5' : ('READ:H5:VOLT?', 'READ:H5:CURR?'),
+'F1' : ('READ:F1:CURR?',),
+'L1' : ('READ:L1:VOLT?', 'READ:L1:CURR?')
+}
+
+# activities during which the values are meaningful
+LIVE_ACTIVITIES = (decoding.RAMP_UP, decoding.MEASURING, decoding.RAMP_DOWN)
+
+SAMPLE = np.dtype([('t', '<f8'), ('channel', 'u1'), ('value', '<f4')])
+
+# magic, version, measurement, start time, number of channels, number of samples
+HEADER = struct.Struct('<4sB2sdBI')
+MAGIC = b'LGST'
+
+class SampleRing(object):
+    """ Preallocated ring of (t, channel, value) samples, the oldest are overwritten. """
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=SAMPLE)
+        self.capacity = capacity
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+    def append(self, t, channel, value):
+        row = self.data[self.count % self.capacity]
+        row['t'] = t
+        row['channel'] = channel
+        row['value'] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def array(self):
+        # chronological copy of the samples
+        if self.count <= self.capacity:
+            return self.data[:self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate((self.data[start:], self.data[:start]))
+
+
+class LiveStream(object):
+    """ Reads the live READ:* values while waitTestEnd polls the status register,
+    at most once every 'interval' seconds, and keeps them in a ring per measurement.
+    Enable it with lg.streamer = LiveStream().
+    The samples of the last 'keep' tests are kept in self.captures as
+    (measurement, start time, channels, array).
+    """
+
+    def __init__(self, interval=0.05, capacity=4096, keep=8, channels=None):
+        self.interval = interval
+        self.channels = channels or CHANNELS
+        self.rings = dict((meas, SampleRing(capacity)) for meas in self.channels)
+        self.captures = deque(maxlen=keep)
+        self.meas = None
+        self.t0 = None
+        self.nextDue = 0.0
+        self.running = False
+        self.cond = threading.Condition()
+
+    def begin(self, meas):
+        with self.cond:
+            self.meas = meas if meas in self.rings else None
+            if self.meas is not None:
+                self.rings[self.meas].reset()
+            self.t0 = time.time()
+            self.nextDue = 0.0
+            self.running = True
+            self.cond.notify_all()
+
+    def poll(self, lg):
+        # called by waitTestEnd after every *STA? request
+        if self.meas is None or lg.activityCode not in LIVE_ACTIVITIES:
+            return
+        now = time.monotonic()
+        if now < self.nextDue:
+            return
+        self.nextDue = now + self.interval
+        ring = self.rings[self.meas]
+        for channel, request in enumerate(self.channels[self.meas]):
+            try:
+                value = float(lg.send_receive(request))
+            except ValueError:
+                logging.debug("streaming: invalid reply to %s", request)
+                continue
+            with self.cond:
+                ring.append(time.time() - self.t0, channel, value)
+                self.cond.notify_all()
+
+    def end(self):
+        with self.cond:
+            if self.meas is not None:
+                self.captures.append((self.meas, self.t0, self.channels[self.meas], self.rings[self.meas].array()))
+            self.running = False
+            self.cond.notify_all()
+
+    def samples(self, capture=-1):
+        # yields (t, channel request, value) of a stored test
+        meas, t0, channels, data = self.captures[capture]
+        for t, channel, value in data:
+            yield (float(t), channels[channel], float(value))
+
+    def follow(self, timeout=1.0):
+        ''' Yields the samples of the running test as they arrive, from another thread.
+        Returns when the test ends.
+        '''
+        with self.cond:
+            while not self.running:
+                if not self.cond.wait(timeout):
+                    return
+            meas = self.meas
+        if meas is None:
+            return
+        ring = self.rings[meas]
+        channels = self.channels[meas]
+        seen = 0
+        while True:
+            with self.cond:
+                while ring.count == seen and self.running:
+                    self.cond.wait(timeout)
+                # samples overwritten before they could be read are skipped
+                start = max(seen, ring.count - ring.capacity)
+                rows = [ring.data[i % ring.capacity].copy() for i in range(start, ring.count)]
+                seen = ring.count
+                running = self.running
+            for row in rows:
+                yield (float(row['t']), channels[row['channel']], float(row['value']))
+            if not running:
+                return
+
+    def export(self, f, capture=-1):
+        # compact binary format: HEADER, channel requests, samples
+        meas, t0, channels, data = self.captures[capture]
+        f.write(HEADER.pack(MAGIC, 1, meas.encode('ascii'), t0, len(channels), len(data)))
+        for request in channels:
+            name = request.encode('ascii')
+            f.write(struct.pack('<B', len(name)) + name)
+        f.write(data.tobytes())
+
+    @staticmethod
+    def load(f):
+        magic, version, meas, t0, nch, n = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("not a LG1800 stream capture")
+        channels = []
+        for i in range(nch):
+            size = struct.unpack('<B', f.read(1))[0]
+            channels.append(f.read(size).decode('ascii'))
+        data = np.frombuffer(f.read(n * SAMPLE.itemsize), dtype=SAMPLE)
+        return (meas.decode('ascii'), t0, tuple(channels), data)
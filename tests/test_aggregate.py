@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_aggregate.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import itertools
+import random
+import unittest
+from .. import aggregate
+from ..results import CTResult, FTResult
+
+HISTOGRAMS = {('CT', 'current'): (-0.5, 0.5, 10), ('FT', 'currentRev'): (0.0, 4.0, 8)}
+
+def records(n=300, seed=0):
+    # CT currents around 0 (negative values and zeros included) and FT results, some of them in autotest
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        if i % 3:
+            current = rng.choice((0.0, -0.0, rng.gauss(0.0, 0.3), rng.uniform(-1.0, 1.0)))
+            ok = current > 0.1
+            out.append(('oven' if i % 2 else None, CTResult(current, "" if ok else "Open circuit", ok)))
+        else:
+            autotest = i % 2 == 0
+            fwd = 0.0 if autotest else rng.uniform(0.0, 4.0)
+            rev = rng.uniform(0.0, 4.0)
+            ok = rev < 3.0
+            out.append(('fridge', FTResult(fwd, fwd, fwd, rev, rev, rev, "" if ok else "vibes", ok, None, autotest)))
+    return out
+
+def feed(aggregator, rows):
+    for product, record in rows:
+        aggregator.update(record, product=product)
+    return aggregator
+
+
+class StationAggregatorTest(unittest.TestCase):
+
+    def assertSameAggregates(self, a, b):
+        # counts, histograms and sketches are exact, the moments up to rounding
+        self.assertEqual(a.accuracy, b.accuracy)
+        self.assertEqual(sorted(a.aggregates, key=repr), sorted(b.aggregates, key=repr))
+        for key, x in a.aggregates.items():
+            y = b.aggregates[key]
+            self.assertEqual((x.product, x.test, x.count, x.passed, x.reasons), (y.product, y.test, y.count, y.passed, y.reasons))
+            self.assertEqual(sorted(x.fields), sorted(y.fields))
+            for name, f in x.fields.items():
+                g = y.fields[name]
+                self.assertEqual((f.stats.n, f.stats.min, f.stats.max), (g.stats.n, g.stats.min, g.stats.max))
+                self.assertAlmostEqual(f.stats.mean, g.stats.mean, places=9)
+                self.assertAlmostEqual(f.stats.m2, g.stats.m2, places=7)
+                self.assertEqual((f.sketch.zero, f.sketch.positive, f.sketch.negative),
+                    (g.sketch.zero, g.sketch.positive, g.sketch.negative))
+                if f.histogram is None:
+                    self.assertIsNone(g.histogram)
+                else:
+                    self.assertEqual((f.histogram.low, f.histogram.high, f.histogram.bins, f.histogram.counts),
+                        (g.histogram.low, g.histogram.high, g.histogram.bins, g.histogram.counts))
+
+    def stations(self, rows, parts=3):
+        # one aggregator per station, the rows dealt among them
+        split = []
+        for i in range(parts):
+            a = aggregate.StationAggregator(histograms=HISTOGRAMS)
+            a.station = 'LG%02d' % i
+            split.append(feed(a, rows[i::parts]))
+        return split
+
+    def test_round_trip(self):
+        a = feed(aggregate.StationAggregator(histograms=HISTOGRAMS), records())
+        a.station = 'LG01'
+        a.update(CTResult(0.0, "Open circuit", False))
+        ct = a.aggregates[(None, 'CT')].fields['current']
+        self.assertGreater(ct.sketch.zero, 0)
+        self.assertTrue(ct.sketch.negative)
+        self.assertIsNotNone(ct.histogram)
+        b = aggregate.StationAggregator.fromBytes(a.toBytes())
+        self.assertEqual(b.stations, a.stations)
+        self.assertSameAggregates(a, b)
+        self.assertEqual(b.summary(), a.summary())
+        self.assertEqual(b.toBytes(), a.toBytes())
+
+    def test_not_an_aggregate(self):
+        self.assertRaises(ValueError, aggregate.StationAggregator.fromBytes, b'XXXX' + bytes(aggregate.HEADER.size))
+
+    def test_merge_equals_single_station(self):
+        rows = records(seed=1)
+        single = feed(aggregate.StationAggregator(histograms=HISTOGRAMS), rows)
+        split = self.stations(rows)
+        # aggregators and their snapshots alike
+        line = aggregate.mergeAll([split[0], split[1].toBytes(), split[2].toBytes()])
+        self.assertSameAggregates(line, single)
+        self.assertEqual(line.stations, dict(('LG%02d' % i, len(rows[i::3])) for i in range(3)))
+
+    def test_merge_order(self):
+        snapshots = [a.toBytes() for a in self.stations(records(seed=2), 4)]
+        first = aggregate.mergeAll(snapshots)
+        for order in itertools.permutations(snapshots):
+            self.assertSameAggregates(aggregate.mergeAll(order), first)
+        # grouping: (a + b) + (c + d)
+        left = aggregate.mergeAll(snapshots[:2])
+        right = aggregate.mergeAll(snapshots[2:])
+        self.assertSameAggregates(aggregate.mergeAll([left, right]), first)
+
+    def test_empty(self):
+        self.assertEqual(aggregate.mergeAll([]).summary(), {'stations': {}, 'tests': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
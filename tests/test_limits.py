@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_limits.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import unittest
+import numpy as np
+from .. import limits
+from ..results import RECORDS, ResultBatch
+
+# limit sets tried for every test, on top of limits.DEFAULTS
+CASES = {
+'CT' : ({}, {'checkimax': True}, {'absolute': True, 'checkimax': True, 'imin': 0.1, 'imax': 0.5},
+        {'nom': 0.5, 'suptolerance': 5, 'inftolerance': 50, 'checkimax': True}),
+'PW' : ({}, {'rmin': 0.02, 'rmax': 0.08}),
+'IS' : ({}, {'rmin': 1e6}),
+'HV' : ({}, {'imin': 0.0005, 'imax': 0.001}),
+'FT' : ({}, {'imin': 1.0, 'imax': 3.0}, {'imin': 1.0, 'imax': 3.0, 'autotest': True}),
+'LC' : ({},)
+}
+
+# values around the limits of CASES, the limits themselves included
+SCALE = {'CT': 0.6, 'PW': 0.1, 'IS': 2e6, 'HV': 0.002, 'FT': 4.0, 'LC': 1e-3}
+EDGES = {'CT': (0.1, 0.24, 0.25, 0.36, 0.5, 0.525), 'PW': (0.02, 0.08, 1.0), 'IS': (1e6,),
+'HV': (0.0005, 0.001, 0.003), 'FT': (1.0, 3.0, 10.0), 'LC': ()}
+
+def sample(test, n=500, seed=0):
+    rng = np.random.RandomState(seed)
+    values = dict((f, rng.uniform(0, SCALE[test], n)) for f in limits.INPUTS[test])
+    for f in values:
+        edges = np.array(EDGES[test], dtype=np.float64)
+        values[f][:len(edges)] = edges
+    return values
+
+def evaluate(test, row, kwargs):
+    if test == 'FT':
+        return limits.evaluateFT(row['currentFwd'], row['currentRev'], **kwargs)
+    if test == 'LC':
+        return limits.evaluateLC()
+    field, = limits.INPUTS[test]
+    return getattr(limits, 'evaluate' + test)(row[field], **kwargs)
+
+
+class JudgeMatchesEvaluateTest(unittest.TestCase):
+    """ The vectorised judge* functions must give the verdicts and reasons of evaluate*,
+    which are what the run* methods return.
+    """
+
+    def test_judges(self):
+        for test, cases in CASES.items():
+            values = sample(test)
+            n = len(values[limits.INPUTS[test][0]])
+            for case in cases:
+                kwargs = dict(limits.DEFAULTS[test], **case)
+                result, code = limits.JUDGES[test](*[values[f] for f in limits.INPUTS[test]], **kwargs)
+                for i in range(n):
+                    row = dict((f, float(values[f][i])) for f in values)
+                    expected = evaluate(test, row, kwargs)
+                    got = (bool(result[i]), limits.REASONS[test][code[i]])
+                    self.assertEqual(got, expected, "%s %s %s" % (test, case, row))
+
+    def test_rejudge(self):
+        for test, cases in CASES.items():
+            values = sample(test, 200, 1)
+            fields = RECORDS[test].fields
+            for case in cases:
+                kwargs = dict(limits.DEFAULTS[test], **case)
+                batch = ResultBatch(test)
+                expected = []
+                for i in range(200):
+                    row = dict((f, float(values[f][i]) if f in values else 0.0) for f in RECORDS[test].numeric)
+                    result, reason = evaluate(test, row, kwargs)
+                    if test == 'FT' and i % 7 == 0:
+                        # failed by the vibration analysis, whatever the limits
+                        result, reason = (False, "vibes")
+                    row['result'] = result
+                    row['reason'] = reason
+                    if 'vtr' in fields:
+                        row['vtr'] = None
+                    batch.append(row)
+                    expected.append((result, reason))
+                result, reason = limits.rejudge(batch, case)
+                got = [(bool(r), batch.reasons[c]) for r, c in zip(result, reason)]
+                self.assertEqual(got, expected, "%s %s" % (test, case))
+
+    def test_rejudge_mixed_autotest(self):
+        # FT rows measured with and without autotest in the same batch:
+        # the autotest rows have currentFwd 0 and must be judged on currentRev only
+        batch = ResultBatch('FT')
+        rows = ((0.0, 2.0, True), (0.0, 2.0, False), (2.0, 2.0, False), (0.0, 4.0, True), (2.5, 0.5, True))
+        expected = []
+        for fwd, rev, autotest in rows:
+            result, reason = limits.evaluateFT(fwd, rev, autotest=autotest)
+            batch.append({'currentFwd': fwd, 'currentMaxFwd': fwd, 'currentMinFwd': fwd,
+                'currentRev': rev, 'currentMaxRev': rev, 'currentMinRev': rev,
+                'result': result, 'reason': reason, 'vtr': None, 'autotest': autotest})
+            expected.append(limits.evaluateFT(fwd, rev, 1, 3, autotest))
+        self.assertEqual([r['autotest'] for r in batch], [r[2] for r in rows])
+        result, reason = limits.rejudge(batch, {'imin': 1, 'imax': 3})
+        got = [(bool(r), batch.reasons[c]) for r, c in zip(result, reason)]
+        self.assertEqual(got, expected)
+        self.assertEqual(got[0], (True, ""))
+        # autotest in the limits judges every row on currentRev
+        result, reason = limits.rejudge(batch, {'imin': 1, 'imax': 3, 'autotest': True})
+        got = [(bool(r), batch.reasons[c]) for r, c in zip(result, reason)]
+        self.assertEqual(got, [limits.evaluateFT(fwd, rev, 1, 3, True) for fwd, rev, a in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
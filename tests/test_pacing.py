@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_pacing.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import time
+import unittest
+from .. import pacing
+
+class GapDevice(object):
+    """ Stands for an LG1800 on a link that loses the reply of a request sent
+    less than dropBelow seconds after the previous one; answers send_receive
+    like LG1800.send_receive (b'0' and connected False when the reply is lost).
+    """
+
+    def __init__(self, pacer, dropBelow):
+        self.pacer = pacer
+        self.dropBelow = dropBelow
+        self.connected = True
+        self.previous = None
+        self.lost = 0
+
+    def send_receive(self, text):
+        now = time.monotonic()
+        early = self.previous is not None and now - self.previous < self.dropBelow
+        self.previous = now
+        self.pacer.mark('query')
+        if early:
+            self.lost += 1
+            self.pacer.failure('query')
+            self.connected = False
+            return b'0'
+        self.pacer.success('query')
+        return b'128'
+
+
+class LinkPacerTest(unittest.TestCase):
+
+    DROP = 0.02
+
+    def calibrated(self, margin=1.5):
+        pacer = pacing.LinkPacer(gap=0.1, minGap=0.005, maxGap=0.2)
+        device = GapDevice(pacer, self.DROP)
+        self.assertTrue(pacer.calibrate(device, samples=5, margin=margin))
+        self.assertTrue(device.connected)
+        return pacer
+
+    def test_calibrate(self):
+        pacer = self.calibrated()
+        # halved from 0.1 until replies went missing
+        self.assertGreaterEqual(pacer.gap['query'], 1.5 * self.DROP)
+        self.assertLess(pacer.gap['query'], 0.1)
+        self.assertEqual(pacer.calibrated['query'], pacer.gap['query'])
+        # the other classes are not calibrated
+        self.assertEqual(pacer.gap['switch'], 0.1)
+        self.assertEqual(pacer.gap['display'], 0.1)
+
+    def test_calibrated_gap_is_safe(self):
+        pacer = self.calibrated()
+        device = GapDevice(pacer, self.DROP)
+        self.assertTrue(pacer.probe(device, 20))
+        self.assertEqual(device.lost, 0)
+
+    def test_failure_and_recovery(self):
+        pacer = self.calibrated()
+        calibrated = pacer.gap['query']
+        pacer.failure('query')
+        pacer.failure('query')
+        self.assertEqual(pacer.gap['query'], calibrated * pacer.backoff ** 2)
+        # a failure restarts the count of the successes
+        for i in range(pacer.recover - 1):
+            pacer.success('query')
+        pacer.failure('query')
+        self.assertEqual(pacer.gap['query'], min(pacer.maxGap, calibrated * pacer.backoff ** 3))
+        for i in range(pacer.recover * 10):
+            pacer.success('query')
+        self.assertEqual(pacer.gap['query'], calibrated)
+
+    def test_fixed_gap(self):
+        pacer = pacing.LinkPacer(gap=0.1, adaptive=False)
+        device = GapDevice(pacer, 0.5)
+        self.assertTrue(pacer.calibrate(device))
+        self.assertIsNone(device.previous)
+        pacer.failure('query')
+        for i in range(pacer.recover * 2):
+            pacer.success('query')
+        for c in pacer.CLASSES:
+            self.assertEqual(pacer.gap[c], 0.1)
+        # the whole gap, even long after the last exchange
+        t0 = time.monotonic()
+        pacer.wait('query')
+        self.assertGreaterEqual(time.monotonic() - t0, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_profiles.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import shutil
+import tempfile
+import unittest
+from .. import fakeLG
+from .. import profiles
+from ..serialLG1800 import LG1800
+
+RECIPE = {'name': 'oven-60', 'configuration': {'PW:TIME': 1.0, 'I5:RMIN': 5e6, 'H5:IMAX': 0.003}}
+
+class ProfileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lg = LG1800(fakeLG.FakeLG1800(), adaptivePacing=False, audio=False)
+        self.dir = tempfile.mkdtemp()
+        self.profile = profiles.ProfileStore(self.lg, self.dir).compile(RECIPE)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rewrite(self, data):
+        with open(profiles.ProfileStore(self.lg, self.dir).cachePath(self.profile.key), 'wb') as f:
+            f.write(data)
+
+    def test_cached_blob_is_reused(self):
+        store = profiles.ProfileStore(self.lg, self.dir)
+        self.assertEqual(store.readCache(self.profile.key), self.profile.payload)
+
+    def test_damaged_blob_is_rebuilt(self):
+        # truncated: the digest doesn't match
+        self.rewrite(hashlib.sha1(self.profile.payload).hexdigest().encode('ascii') + b'\n' + self.profile.payload[:-10])
+        store = profiles.ProfileStore(self.lg, self.dir)
+        self.assertIsNone(store.readCache(self.profile.key))
+        self.assertEqual(store.compile(RECIPE).payload, self.profile.payload)
+        self.assertEqual(store.readCache(self.profile.key), self.profile.payload)
+
+    def test_invalid_commands_are_not_sent(self):
+        # a matching digest is not enough
+        payload = self.profile.payload + b'CONF:PW:TIME 1.0;*RST\n'
+        self.rewrite(hashlib.sha1(payload).hexdigest().encode('ascii') + b'\n' + payload)
+        store = profiles.ProfileStore(self.lg, self.dir)
+        self.assertIsNone(store.readCache(self.profile.key))
+        self.assertEqual(store.compile(RECIPE).payload, self.profile.payload)
+
+    def test_key_follows_the_formatter(self):
+        store = profiles.ProfileStore(self.lg, self.dir)
+        self.assertEqual(store.recipeKey(RECIPE['configuration']), self.profile.key)
+        formatConfiguration = self.lg.formatConfiguration
+        self.lg.formatConfiguration = lambda par, value, strict=False: formatConfiguration(par, value, strict) + '0'
+        store = profiles.ProfileStore(self.lg, self.dir)
+        self.assertNotEqual(store.recipeKey(RECIPE['configuration']), self.profile.key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_sequences.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import threading
+import unittest
+from .. import fakeLG
+from .. import transport
+from ..sequences import Sequence
+from ..serialLG1800 import LG1800
+
+class RecordingFake(fakeLG.FakeLG1800):
+    # keeps every command received
+
+    def __init__(self, *args, **kwargs):
+        fakeLG.FakeLG1800.__init__(self, *args, **kwargs)
+        self.received = []
+
+    def handle(self, cmd):
+        self.received.append(cmd)
+        fakeLG.FakeLG1800.handle(self, cmd)
+
+
+class ElisionTest(unittest.TestCase):
+    """ The requests skipped while a sequence runs, and what the device ends up with. """
+
+    STEPS = [{'test': 'CT', 'configuration': {'PW:TIME': 1.0}, 'outputs': ['ext1']}] * 3
+
+    def setUp(self):
+        self.host, self.device = transport.memoryPair(timeout=0.5)
+        self.fake = RecordingFake(testTime=0.02)
+        self.thread = threading.Thread(target=self.fake.serve, args=(self.device,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.lg = LG1800(self.host, adaptivePacing=False, audio=False)
+        for c in self.lg.pacer.CLASSES:
+            self.lg.pacer.gap[c] = 0.0
+        self.sequence = Sequence(self.STEPS, name='CT x3')
+
+    def tearDown(self):
+        self.device.close()
+        self.thread.join(1)
+
+    def run_sequence(self):
+        # (*SET, CONF) commands that reached the device during one run
+        del self.fake.received[:]
+        result = self.sequence.run(self.lg)
+        self.assertTrue(result['result'])
+        self.assertEqual(len(result['steps']), 3)
+        sets = [c for c in self.fake.received if c.startswith('*SET ')]
+        confs = [c for c in self.fake.received if c.startswith('CONF:')]
+        return (sets, confs)
+
+    def assert_register(self):
+        # what we believe of the contactors is what the device has
+        known = self.lg.outputKnown
+        self.assertEqual(self.fake.register & known, self.lg.outputRegister & known)
+
+    def test_repeated_steps(self):
+        sets, confs = self.run_sequence()
+        # "ext1" is set when connecting; OFF once before the first CT, 0uf at the end
+        self.assertEqual(sets, ['*SET ' + self.lg.FUSES['OFF'], '*SET ' + self.lg.FUSES['0uf']])
+        self.assertEqual(len(confs), 1)
+        self.assertTrue(confs[0].startswith('CONF:PW:TIME '))
+        self.assert_register()
+        # nothing to change the second time
+        self.assertEqual(self.run_sequence(), ([], []))
+        self.assert_register()
+
+    def test_defaults_are_sent_again(self):
+        self.run_sequence()
+        self.lg.send("CONF:PW:DEF")
+        sets, confs = self.run_sequence()
+        self.assertEqual(sets, [])
+        self.assertEqual(len(confs), 1)
+        self.assertTrue(confs[0].startswith('CONF:PW:TIME '))
+
+    def test_reset(self):
+        self.run_sequence()
+        self.lg.send("*RST")
+        self.assertEqual(self.fake.register, 0)
+        sets, confs = self.run_sequence()
+        self.assertEqual(sets, ['*SET ' + self.lg.FUSES[k] for k in ('ext1', 'OFF', '0uf')])
+        self.assertEqual(len(confs), 1)
+        self.assert_register()
+        clear, set_ = self.lg.outputMasks('ext1')
+        self.assertEqual(self.fake.register, set_ | self.lg.outputMasks('OFF')[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
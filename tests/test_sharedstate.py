@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_sharedstate.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import os
+import subprocess
+import sys
+import unittest
+from multiprocessing import shared_memory
+from .. import sharedstate
+
+class StatePublisherTest(unittest.TestCase):
+
+    NAME = 'lg1800-test-%d' % os.getpid()
+
+    def tearDown(self):
+        try:
+            shm = shared_memory.SharedMemory(name=self.NAME)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+    def test_writer_pid(self):
+        publisher = sharedstate.StatePublisher(self.NAME)
+        reader = sharedstate.StateReader(self.NAME)
+        self.assertEqual(reader.writer(), os.getpid())
+        reader.close()
+        publisher.close()
+
+    def test_live_block_is_kept(self):
+        publisher = sharedstate.StatePublisher(self.NAME)
+        self.assertRaises(FileExistsError, sharedstate.StatePublisher, self.NAME)
+        # still published
+        self.assertEqual(bytes(publisher.buf[:8]), bytes(8))
+        publisher.close()
+
+    @unittest.skipIf(os.name == 'nt', "the writer is always assumed alive on Windows")
+    def test_stale_block_is_replaced(self):
+        # a block left over by a process that is gone
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        publisher = sharedstate.StatePublisher(self.NAME)
+        sharedstate.WRITER.pack_into(publisher.buf, sharedstate.WRITER_OFFSET, child.pid)
+        publisher.close(unlink=False)
+        sharedstate.CREATED.discard(self.NAME)
+        publisher = sharedstate.StatePublisher(self.NAME)
+        reader = sharedstate.StateReader(self.NAME)
+        self.assertEqual(reader.writer(), os.getpid())
+        reader.close()
+        publisher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    tests/test_transport.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+import socket
+import threading
+import unittest
+from .. import fakeLG
+from .. import transport
+from ..serialLG1800 import LG1800
+
+class FrameEncoderTest(unittest.TestCase):
+
+    def test_constant_commands_are_cached(self):
+        encoder = transport.FrameEncoder()
+        first = encoder.frame("*STA?")
+        self.assertEqual(first, b'*STA?\n')
+        self.assertIs(encoder.frame("*STA?"), first)
+
+    def test_commands_with_parameters(self):
+        encoder = transport.FrameEncoder()
+        self.assertEqual(encoder.frame("CONF:PW:TIME 01.0"), b'CONF:PW:TIME 01.0\n')
+        self.assertNotIn("CONF:PW:TIME 01.0", encoder.cache)
+
+
+class MemoryTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host, self.device = transport.memoryPair(timeout=0.2)
+
+    def test_single_line_frames_are_not_copied(self):
+        frame = b'*STA?\n'
+        self.host.writeFrames(frame)
+        self.assertIs(self.device.readFrame(), frame)
+
+    def test_frames_are_split_into_lines(self):
+        self.host.writeFrames(b'CONF:PW:TIME 01.0\nCONF:PW:IM', bytearray(b'IN 10\n'))
+        self.assertEqual(self.device.readFrame(), b'CONF:PW:TIME 01.0\n')
+        self.assertEqual(self.device.readFrame(), b'CONF:PW:IMIN 10\n')
+
+    def test_timeout_and_flush(self):
+        self.assertEqual(self.device.readFrame(), b'')
+        self.host.writeFrames(b'late\n')
+        self.device.flush()
+        self.assertEqual(self.device.readFrame(), b'')
+
+    def test_closed_link(self):
+        self.host.close()
+        self.assertRaises(transport.TransportError, self.host.writeFrames, b'*STA?\n')
+
+
+class SocketTransportTest(unittest.TestCase):
+    # frames larger than the socket buffers, so that the writes are partial
+
+    def setUp(self):
+        self.link = transport.SocketTransport('localhost', 0, timeout=5.0)
+        self.link.sock, self.peer = socket.socketpair()
+        self.link.sock.setblocking(False)
+        self.sendmsg = transport.SENDMSG
+
+    def tearDown(self):
+        transport.SENDMSG = self.sendmsg
+        self.link.close()
+        self.peer.close()
+
+    def write_and_read(self):
+        frames = [b'CONF:PW:TIME 01.0\n', bytearray(b'x' * 3000000), memoryview(b'y' * 1000000 + b'\n')]
+        received = bytearray()
+        def reader():
+            while len(received) < sum(len(f) for f in frames):
+                data = self.peer.recv(65536)
+                if not data:
+                    break
+                received.extend(data)
+        thread = threading.Thread(target=reader)
+        thread.daemon = True
+        thread.start()
+        self.link.writeFrames(*frames)
+        thread.join(5)
+        self.assertEqual(bytes(received), b''.join(frames))
+
+    def test_sendmsg(self):
+        if not self.sendmsg:
+            self.skipTest("no socket.sendmsg")
+        self.write_and_read()
+
+    def test_without_sendmsg(self):
+        # as on Windows
+        transport.SENDMSG = False
+        self.write_and_read()
+
+
+class ProtocolTest(unittest.TestCase):
+    """ LG1800 over the in-memory link, with the fake instrument on the device end. """
+
+    def setUp(self):
+        self.host, self.device = transport.memoryPair(timeout=0.5)
+        self.fake = fakeLG.FakeLG1800(testTime=0.02)
+        self.thread = threading.Thread(target=self.fake.serve, args=(self.device,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.lg = LG1800(self.host, adaptivePacing=False, audio=False)
+        for c in self.lg.pacer.CLASSES:
+            self.lg.pacer.gap[c] = 0.0
+
+    def tearDown(self):
+        self.device.close()
+        self.thread.join(1)
+
+    def test_identification(self):
+        self.assertTrue(self.lg.connected)
+        self.assertEqual(self.lg.lgsn, 'FAKE0001')
+
+    def test_run(self):
+        record = self.lg.runCT()
+        self.assertTrue(record['result'])
+        self.assertEqual(record['current'], 0.3)
+
+    def test_outputs_reach_the_device(self):
+        self.lg.outputFunctional("ext1")
+        clear, set_ = self.lg.outputMasks("ext1")
+        self.assertEqual(self.fake.register & (clear | set_), set_)
+
+    def test_inputs(self):
+        self.fake.inputs = 0x8001
+        self.lg.inputLevels()
+        self.assertEqual(self.lg.inputs[0], 1)
+        self.assertEqual(self.lg.inputs[15], 1)
+        self.assertEqual(self.lg.inputs[1], 0)
+
+    def test_error_codes_are_counted(self):
+        # more errors than the log keeps
+        self.fake.errors.extend(['3,Wrong command'] * 150 + ['200,Queue overflow'] * 2)
+        self.assertEqual(self.lg.drainERRqueue(200), 152)
+        self.assertEqual(len(self.lg.errorLog), 100)
+        self.assertEqual(self.lg.errorCodes[3], 150)
+        self.assertEqual(self.lg.errorCodes[200], 2)
+        self.assertEqual(self.lg.counters['errors'], 152)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#    transport.py
+#
+#    Copyright 2017 Alessandro Proglio <ale.proglio@gmail.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#    documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+#    the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+#    and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all copies or substantial
+#    portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#    TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#     OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#     DEALINGS IN THE SOFTWARE.
+
+''' Links to the LG1800. The LG1800 class only uses the Transport methods:
+
+    writeFrames(*frames)  writes one or more newline terminated frames (bytes-like) in one go
+    readFrame()           returns the next line received, b'' on timeout
+    flush()               discards the input not read yet (e.g. a late reply)
+    reconnect()           closes and opens the link again
+    close()
+
+openTransport(port) picks the implementation from the port:
+    'COMx', '/dev/ttyX'      SerialTransport, RS232 through pySerial
+    'tcp://host:port'        SocketTransport, raw non-blocking socket with TCP_NODELAY
+    'socket://host:port'...  SerialTransport, any other pySerial URL
+    a Transport              used as it is (e.g. one end of memoryPair())
+    a serial-like object     SerialTransport wrapping it (e.g. fakeLG.FakeLG1800)
+'''
+
+import logging
+import select
+import socket
+import threading
+import time
+from collections import deque
+try:
+    import serial
+except ImportError:
+    serial = None
+
+NEWLINE = b'\n'
+# socket.sendmsg is missing on Windows
+SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+class TransportError(IOError):
+    pass
+
+
+class FrameEncoder(object):
+    """ Turns the commands into frames. The commands without parameters
+    (*STA?, *ERR?, *INPW?, READ:...: the whole polling path) are encoded once
+    and then served from the cache without allocating; the commands with
+    parameters (CONF, *SET, DISP) are encoded at every call.
+    """
+
+    def __init__(self, maxCached=512):
+        self.cache = {}
+        self.maxCached = maxCached
+
+    def frame(self, text):
+        f = self.cache.get(text)
+        if f is not None:
+            return f
+        f = (text + '\n').encode('UTF-8')
+        if ' ' not in text and len(self.cache) < self.maxCached:
+            self.cache[text] = f
+        return f
+
+
+class Transport(object):
+    """ Base class, see the module docstring. """
+
+    def open(self):
+        pass
+
+    def writeFrames(self, *frames):
+        raise NotImplementedError
+
+    def readFrame(self):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def close(self):
+        pass
+
+
+class SerialTransport(Transport):
+    """ pySerial port, opened from a port name or URL, or any object with
+    write() and readline() (an already open serial.Serial, fakeLG.FakeLG1800).
+    """
+
+    def __init__(self, port, timeout=1):
+        self.timeout = timeout
+        if isinstance(port, str):
+            self.port = port
+            self.s = None
+        else:
+            self.port = None
+            self.s = port
+        # RS232 ports may need time to come back, see LG1800.connect
+        self.local = isinstance(port, str) and (('COM' in port) or ('tty' in port))
+
+    def __str__(self):
+        return self.port or repr(self.s)
+
+    def open(self):
+        if self.port is None:
+            return
+        if serial is None:
+            raise TransportError("pySerial is needed for %s" % self.port)
+        if self.local:
+            self.s = serial.Serial()
+            self.s.port = self.port
+            self.s.timeout = self.timeout
+            self.s.open()
+        else:
+            self.s = serial.serial_for_url(self.port, timeout=self.timeout)
+
+    def writeFrames(self, *frames):
+        if len(frames) == 1:
+            self.s.write(frames[0])
+        else:
+            self.s.write(b''.join(frames))
+
+    def readFrame(self):
+        return self.s.readline()
+
+    def flush(self):
+        reset = getattr(self.s, 'reset_input_buffer', None)
+        if reset is not None:
+            reset()
+
+    def reconnect(self):
+        if self.port is None:
+            # not ours to reopen
+            self.flush()
+            return
+        self.close()
+        self.open()
+
+    def close(self):
+        if self.port is not None and self.s is not None:
+            self.s.close()
+            self.s = None
+
+
+class SocketTransport(Transport):
+    """ Raw TCP link to the Ethernet port of the LG1800 or to a serial to
+    Ethernet converter. Non-blocking socket with TCP_NODELAY, so that every
+    request leaves at once; the lines are split from a receive buffer.
+    """
+
+    def __init__(self, host, port, timeout=1.0, connectTimeout=5.0, chunk=4096):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connectTimeout = connectTimeout
+        self.sock = None
+        self.rx = bytearray()
+        self.chunk = bytearray(chunk)
+        self.chunkView = memoryview(self.chunk)
+
+    def __str__(self):
+        return "tcp://%s:%d" % (self.host, self.port)
+
+    def open(self):
+        self.sock = socket.create_connection((self.host, self.port), self.connectTimeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        del self.rx[:]
+
+    def writeFrames(self, *frames):
+        if self.sock is None:
+            raise TransportError("not connected")
+        if SENDMSG:
+            # scatter/gather: the frames are not joined
+            pending = [memoryview(f) for f in frames]
+        else:
+            pending = [memoryview(b''.join(frames))]
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            try:
+                if SENDMSG:
+                    sent = self.sock.sendmsg(pending)
+                else:
+                    sent = self.sock.send(pending[0])
+            except BlockingIOError:
+                sent = 0
+            while sent and pending:
+                if sent >= len(pending[0]):
+                    sent -= len(pending[0])
+                    pending.pop(0)
+                else:
+                    pending[0] = pending[0][sent:]
+                    sent = 0
+            if pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([], [self.sock], [], remaining)[1]:
+                    raise TransportError("write timeout")
+
+    def readFrame(self):
+        if self.sock is None:
+            raise TransportError("not connected")
+        deadline = None
+        start = 0
+        while True:
+            end = self.rx.find(NEWLINE, start)
+            if end >= 0:
+                frame = bytes(self.rx[:end + 1])
+                del self.rx[:end + 1]
+                return frame
+            start = len(self.rx)
+            try:
+                n = self.sock.recv_into(self.chunk)
+            except BlockingIOError:
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([self.sock], [], [], remaining)[0]:
+                    # timeout, like pySerial's readline
+                    return b''
+                continue
+            if n == 0:
+                raise TransportError("connection closed by %s" % self)
+            self.rx += self.chunkView[:n]
+
+    def flush(self):
+        del self.rx[:]
+        if self.sock is None:
+            return
+        try:
+            while self.sock.recv_into(self.chunk):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                logging.debug("errore nella chiusura del socket", exc_info=True)
+            self.sock = None
+
+
+class MemoryTransport(Transport):
+    """ One end of an in-memory link, see memoryPair(). The frames written on
+    one end are read as lines on the other; for tests and simulated devices.
+    The frames are queued as they are: a bytes frame holding exactly one line
+    (every command of LG1800.send/send_receive) is returned by readFrame on
+    the other end without any copy. Other frames are copied when they are
+    queued (bytearray, memoryview: the writer may reuse them) or split.
+    """
+
+    def __init__(self, cond, inbox, outbox, timeout=1.0):
+        self.cond = cond
+        self.inbox = inbox
+        self.outbox = outbox
+        self.timeout = timeout
+        self.closed = False
+
+    def writeFrames(self, *frames):
+        if self.closed:
+            raise TransportError("closed")
+        with self.cond:
+            for f in frames:
+                self.outbox.append(f if type(f) is bytes else bytes(f))
+            self.cond.notify_all()
+
+    def nextLine(self):
+        inbox = self.inbox
+        while inbox:
+            head = inbox[0]
+            end = head.find(NEWLINE)
+            if end == len(head) - 1:
+                return inbox.popleft()
+            if end >= 0:
+                inbox[0] = head[end + 1:]
+                return head[:end + 1]
+            if len(inbox) == 1:
+                break
+            # a line split across frames
+            inbox.popleft()
+            inbox[0] = head + inbox[0]
+        return None
+
+    def readFrame(self):
+        with self.cond:
+            frame = self.nextLine()
+            if frame is None:
+                deadline = time.monotonic() + self.timeout
+                while frame is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self.closed:
+                        return b''
+                    self.cond.wait(remaining)
+                    frame = self.nextLine()
+            return frame
+
+    def flush(self):
+        with self.cond:
+            self.inbox.clear()
+
+    def reconnect(self):
+        self.closed = False
+        self.flush()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def memoryPair(timeout=1.0):
+    # (host end, device end)
+    cond = threading.Condition()
+    a = deque()
+    b = deque()
+    return (MemoryTransport(cond, a, b, timeout), MemoryTransport(cond, b, a, timeout))
+
+def openTransport(port, timeout=1):
+    ''' Returns the Transport for port (see the module docstring), not opened yet. '''
+    if isinstance(port, Transport):
+        return port
+    if not isinstance(port, str):
+        return SerialTransport(port, timeout)
+    if port.startswith('tcp://'):
+        host, number = port[6:].rsplit(':', 1)
+        return SocketTransport(host, int(number), timeout)
+    return SerialTransport(port, timeout)
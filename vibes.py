@@ -21,12 +21,16 @@
 
 import logging
 import numpy as np
-import pyaudio
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 
 class VibesAnalyzer:
 
-    def __init__(self, seconds=0.25, channel=0):
-        self.FORMAT = pyaudio.paFloat32
+    def __init__(self, seconds=0.25, channel=0, openStream=True):
+        # openStream=False builds an analyzer without audio input,
+        # campiona() can then be fed with recorded or synthetic data
         self.CHANNELS = 2
         self.RATE = 44100
         self.CHUNK = 882
@@ -39,6 +43,13 @@ class VibesAnalyzer:
         self.spec_y = 0
         self.data = []
 
+        if not openStream:
+            self.pa = None
+            self.stream = None
+            return
+        if pyaudio is None:
+            raise ImportError("pyaudio is needed to record the vibration test")
+        self.FORMAT = pyaudio.paFloat32
         self.pa = pyaudio.PyAudio()
         self.listDevices()
         self.formatIsSupported()
@@ -59,26 +70,32 @@ class VibesAnalyzer:
         of [L0, L1, L2, ...] and right channel of [R0, R1, R2, ...], the output 
         is ordered as [L0, R0, L1, R1, ...]
         """
-        for i in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
+        for i in range(0, int(self.RATE / self.CHUNK * self.RECORD_SECONDS)):
             chdata = self.stream.read(self.CHUNK)
-            ret = np.fromstring(chdata, np.float32)
-            chunk_length = len(ret) / channels
+            ret = np.frombuffer(chdata, np.float32)
+            chunk_length = len(ret) / self.CHANNELS
             assert chunk_length == int(chunk_length)
-            ret = np.reshape(ret, (chunk_length, channels))
+            ret = np.reshape(ret, (int(chunk_length), self.CHANNELS))
             self.data.append(ret[:, self.channel])
+        self.data = np.concatenate(self.data)
 
-    def removeDCoffset():
+    def removeDCoffset(self):
         self.data -= np.mean(self.data)
         # we can also shift the zero frequency to the middle of the spectrum
         #self.data = np.fft.fftshift(self.data)
 
-    def campiona(self):
-        self.data = []
-        self.readChunks()
+    def campiona(self, data=None):
+        # data: samples of the selected channel, read from the audio input when None
+        if data is None:
+            self.data = []
+            self.readChunks()
+        else:
+            self.data = np.array(data, dtype=np.float32)
         self.removeDCoffset()
         #self.normalizeInput()
+        # the whole recording; the frequencies follow its length (self.N is not used here)
         y = np.fft.fft(self.data)
-        self.spec_x = np.fft.fftfreq(self.N, d = 1.0 / self.RATE)
+        self.spec_x = np.fft.fftfreq(len(self.data), d = 1.0 / self.RATE)
         # trova frequenza maggiore di 1100 Hz o minore di 3500 Hz
         # centro del range in 2300 Hz, span +-1200 Hz
         i, = np.where( abs(self.spec_x - 2300.) <= 1200. )